@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Générateur de données synthétiques reproductibles pour les benchmarks.
+
+Produit drugs.csv, pubmed.csv, pubmed.json (JSON "lenient" : BOM, virgule finale)
+et clinical_trials.csv, avec des titres mentionnant des médicaments, des séquences
+'\\xNN' (mojibake) et des formats de dates mélangés, comme dans Data/.
+L'écriture se fait ligne à ligne : 10M titres ne sont jamais en mémoire.
+
+    python benchmarks/generate_data.py --out /tmp/bench_data --titles 1000000 --drugs 2000
+"""
+from __future__ import annotations
+import csv
+import json
+import random
+from argparse import ArgumentParser
+from pathlib import Path
+
+SYLLABLES = ("a", "be", "ta", "cy", "clo", "di", "phen", "hy", "dra", "mi", "ne", "tra", "nex", "mo",
+             "pro", "xi", "zo", "lam", "ri", "van", "to", "sul", "fa", "met", "for", "ol", "pra", "zi")
+SUFFIXES = ("INE", "OL", "ONE", "AMIDE", "ACID", "MYCIN", "CILLIN", "PRIL", "SARTAN", "AZOLE")
+WORDS = ("study", "effect", "of", "the", "in", "patients", "with", "treatment", "therapy", "trial",
+         "randomized", "dose", "versus", "children", "chronic", "acute", "pain", "after", "and", "for",
+         "controlled", "evaluation", "safety", "efficacy", "infection", "response", "a", "on")
+MONTHS = ("January", "February", "March", "April", "May", "June", "July", "August", "September",
+          "October", "November", "December")
+MOJIBAKE = ("\\xc3\\xa9", "\\xc3\\xb1", "\\xc3\\xa8", "\\xc3\\x28")
+
+def drug_names(rng: random.Random, n: int) -> list[tuple[str, str]]:
+    """(atccode, drug) uniques ; quelques noms composés et accentués."""
+    seen, out = set(), []
+    while len(out) < n:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).upper() + rng.choice(SUFFIXES)
+        if rng.random() < 0.05:
+            name += " " + rng.choice(("ACID", "SODIUM", "HYDROCHLORIDE"))
+        if rng.random() < 0.01:
+            name = "É" + name
+        if name in seen:
+            continue
+        seen.add(name)
+        atc = f"{chr(65 + len(out) % 26)}{len(out) // 26 % 100:02d}{chr(65 + len(out) // 2600 % 26)}{chr(65 + rng.randrange(26))}"
+        out.append((atc, name))
+    return out
+
+def journals(rng: random.Random, n: int) -> list[str]:
+    out = []
+    for i in range(n):
+        name = " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3)))
+        name = f"Journal of {name} {i}"
+        if rng.random() < 0.05:
+            name += rng.choice(MOJIBAKE)
+        out.append(name)
+    return out
+
+def random_date(rng: random.Random) -> str:
+    y, m, d = rng.randint(2015, 2022), rng.randint(1, 12), rng.randint(1, 28)
+    r = rng.random()
+    if r < 0.5:
+        return f"{d:02d}/{m:02d}/{y}"
+    if r < 0.75:
+        return f"{y}-{m:02d}-{d:02d}"
+    if r < 0.97:
+        return f"{d} {MONTHS[m - 1]} {y}"
+    return ""
+
+def make_title(rng: random.Random, names: list[str], mention_rate: float) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+    while rng.random() < mention_rate:
+        n = rng.choice(names)
+        n = rng.choice((n, n.lower(), n.title()))
+        words.insert(rng.randrange(len(words) + 1), n + rng.choice(("", "", ",", ".", "s")))
+    if rng.random() < 0.01:
+        words.append(rng.choice(MOJIBAKE))
+    return " ".join(words).capitalize()
+
+def generate(out: Path, titles: int = 10_000, drugs: int = 100, seed: int = 0,
+             mention_rate: float = 0.6, n_journals: int | None = None) -> dict:
+    """Écrit le jeu de données dans `out` : 60 % des titres dans pubmed.csv, 25 % dans
+    pubmed.json, 15 % dans clinical_trials.csv. Renvoie le nombre de lignes par fichier."""
+    rng = random.Random(seed)
+    out.mkdir(parents=True, exist_ok=True)
+    drug_rows = drug_names(rng, drugs)
+    names = [d for _, d in drug_rows]
+    jn = journals(rng, n_journals or max(20, drugs // 5))
+    n_csv, n_json = int(titles * 0.6), int(titles * 0.25)
+    n_ct = titles - n_csv - n_json
+
+    with (out / "drugs.csv").open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["atccode", "drug"])
+        w.writerows(drug_rows)
+
+    with (out / "pubmed.csv").open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "title", "date", "journal"])
+        for i in range(n_csv):
+            pid = "" if rng.random() < 0.01 else i + 1
+            w.writerow([pid, make_title(rng, names, mention_rate), random_date(rng), rng.choice(jn)])
+
+    with (out / "pubmed.json").open("w", encoding="utf-8") as f:
+        f.write("﻿[\n")
+        for i in range(n_json):
+            pid = n_csv + i + 1
+            item = {"id": "" if rng.random() < 0.01 else (str(pid) if i % 2 else pid),
+                    "title": make_title(rng, names, mention_rate),
+                    "date": random_date(rng), "journal": rng.choice(jn)}
+            f.write(" " + json.dumps(item, ensure_ascii=False) + ",\n")   # virgule finale tolérée
+        f.write("]")
+
+    with (out / "clinical_trials.csv").open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "scientific_title", "date", "journal"])
+        for i in range(n_ct):
+            tid = "" if rng.random() < 0.01 else f"NCT{i:08d}"
+            w.writerow([tid, make_title(rng, names, mention_rate), random_date(rng), rng.choice(jn)])
+
+    return {"drugs": drugs, "pubmed_csv": n_csv, "pubmed_json": n_json, "clinical_trials": n_ct}
+
+def main():
+    p = ArgumentParser(description="Génère un jeu de données synthétique pour les benchmarks")
+    p.add_argument("--out", type=Path, required=True)
+    p.add_argument("--titles", type=int, default=10_000, help="nb total de titres (pubmed + essais)")
+    p.add_argument("--drugs", type=int, default=100)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--mention-rate", type=float, default=0.6, help="probabilité d'une mention supplémentaire")
+    args = p.parse_args()
+    counts = generate(args.out, args.titles, args.drugs, args.seed, args.mention_rate)
+    print(f"[ok] données écrites → {args.out} {counts}")
+
+if __name__ == "__main__":
+    main()
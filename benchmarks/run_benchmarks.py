@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Benchmarks de l'ETL sur données synthétiques (benchmarks/generate_data.py).
+
+Chaque benchmark est chronométré `--repeat` fois (meilleur temps retenu) puis rejoué une
+fois sous tracemalloc pour le pic mémoire Python. Résultats : débit (éléments/s) et pic
+mémoire, écrits en JSON ; comparés à une baseline sauvegardée (code retour 1 si régression).
+Les caches mémoïsés (dates, mojibake) restent chauds d'une répétition à l'autre, comme
+entre les blocs d'un run en streaming.
+
+    python benchmarks/run_benchmarks.py --scale small --save-baseline
+    python benchmarks/run_benchmarks.py --scale small          # compare à la baseline
+"""
+from __future__ import annotations
+import contextlib
+import importlib.util
+import io as _io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+if str(ROOT / "src") not in sys.path:
+    sys.path.append(str(ROOT / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import pandas as pd
+from generate_data import generate
+from test_pipline.config import Config
+from test_pipline.io import load_lenient_json_list, read_drugs, read_pubmed, read_clinical_trials
+from test_pipline.clean import add_iso_date
+from test_pipline.match import build_patterns, build_matcher, find_mentions, EDGE_COLUMNS
+from test_pipline.aggregate import build_by_atc
+from test_pipline.pipeline import run_pipeline
+from test_pipline.ranking import JournalCounter, iter_atc_records
+
+SCALES = {"tiny": (2_000, 50), "small": (20_000, 200), "medium": (200_000, 1_000),
+          "large": (2_000_000, 5_000), "xlarge": (10_000_000, 10_000)}
+RESULTS_DIR = BENCH_DIR / "results"
+
+def _load_top_journal():
+    spec = importlib.util.spec_from_file_location("top_journal", ROOT / "tools" / "top_journal.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def measure(fn: Callable[[], Any], n_items: int, repeat: int) -> Dict[str, float]:
+    """Meilleur temps sur `repeat` exécutions, puis une exécution sous tracemalloc (pic)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"items": n_items, "seconds": round(best, 4),
+            "items_per_s": round(n_items / best, 1) if best > 0 else None,
+            "peak_mb": round(peak / 2**20, 2)}
+
+def run_all(data_dir: Path, repeat: int, only: set | None = None) -> Dict[str, Dict[str, float]]:
+    """Exécute les benchmarks sur les fichiers de data_dir (préparation hors chronométrage)."""
+    results: Dict[str, Dict[str, float]] = {}
+    quiet = contextlib.redirect_stdout(_io.StringIO())
+
+    def bench(name: str, fn: Callable[[], Any], n_items: int) -> None:
+        if only and name not in only:
+            return
+        with contextlib.redirect_stdout(_io.StringIO()):
+            results[name] = measure(fn, n_items, repeat)
+        r = results[name]
+        print(f"  {name:<24} {r['seconds']:>9.3f} s  {r['items_per_s'] or 0:>12,.0f} /s  {r['peak_mb']:>8.1f} Mo")
+
+    json_fp = data_dir / "pubmed.json"
+    with quiet:
+        drugs = read_drugs(data_dir / "drugs.csv")
+        pubmed = read_pubmed(data_dir / "pubmed.csv", json_fp)
+        ctrials = read_clinical_trials(data_dir / "clinical_trials.csv")
+    n_json = len(load_lenient_json_list(json_fp))
+    bench("load_lenient_json_list", lambda: load_lenient_json_list(json_fp), n_json)
+    bench("add_iso_date", lambda: add_iso_date(pubmed, dayfirst=True), len(pubmed))
+
+    pubmed = add_iso_date(pubmed, dayfirst=True)
+    ctrials = add_iso_date(ctrials, dayfirst=True)
+    matcher = build_matcher(build_patterns(drugs))
+    bench("find_mentions", lambda: find_mentions(pubmed, "pubmed", matcher), len(pubmed))
+
+    parts = [p for p in (find_mentions(pubmed, "pubmed", matcher), find_mentions(ctrials, "clinical_trial", matcher))
+             if not p.empty]
+    edges = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=EDGE_COLUMNS)
+    bench("build_by_atc", lambda: build_by_atc(edges, generate_auto_id_if_empty=True), len(edges))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = Config(data_dir=data_dir, out_dir=Path(tmp), columnar_output=False)
+        bench("run_pipeline", lambda: run_pipeline(cfg), len(pubmed) + len(ctrials))
+        if not cfg.by_atc_json_fp.exists():
+            with quiet:
+                run_pipeline(cfg)
+        tj = _load_top_journal()
+        n_atc = JournalCounter().update(iter_atc_records(cfg.by_atc_json_fp)).n_atc
+        bench("top_journal", lambda: JournalCounter().update(iter_atc_records(cfg.by_atc_json_fp)).top(1), n_atc)
+        if cfg.store_fp.exists():
+            bench("top_journal_store", lambda: tj.load_rows_store(cfg.store_fp, 1), n_atc)
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> list[str]:
+    """Régressions : débit < (1 - threshold) x baseline ou pic mémoire > (1 + threshold) x baseline."""
+    issues = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        if b.get("items_per_s") and r.get("items_per_s") and r["items_per_s"] < b["items_per_s"] * (1 - threshold):
+            issues.append(f"{name}: débit {r['items_per_s']:,.0f}/s < baseline {b['items_per_s']:,.0f}/s")
+        if b.get("peak_mb") and r["peak_mb"] > b["peak_mb"] * (1 + threshold) and r["peak_mb"] - b["peak_mb"] > 1:
+            issues.append(f"{name}: pic mémoire {r['peak_mb']} Mo > baseline {b['peak_mb']} Mo")
+    return issues
+
+def main():
+    p = ArgumentParser(description="Benchmarks ETL (débit et pic mémoire)")
+    p.add_argument("--scale", choices=list(SCALES), default="small")
+    p.add_argument("--titles", type=int, help="remplace le nb de titres de --scale")
+    p.add_argument("--drugs", type=int, help="remplace le nb de médicaments de --scale")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--data-dir", type=Path, help="jeu existant (sinon généré et mis en cache)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--only", nargs="*", help="sous-ensemble de benchmarks")
+    p.add_argument("--output", type=Path, help="JSON des résultats (défaut : results/<scale>.json)")
+    p.add_argument("--baseline", type=Path, help="baseline à comparer (défaut : results/baseline_<scale>.json)")
+    p.add_argument("--save-baseline", action="store_true", help="enregistre les résultats comme baseline")
+    p.add_argument("--threshold", type=float, default=0.2, help="tolérance relative avant régression")
+    args = p.parse_args()
+
+    titles, drugs = SCALES[args.scale]
+    titles, drugs = args.titles or titles, args.drugs or drugs
+    label = f"{args.scale}" if not (args.titles or args.drugs) else f"{titles}x{drugs}"
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = BENCH_DIR / "data" / f"{titles}_{drugs}_{args.seed}"
+        if not (data_dir / "drugs.csv").exists():
+            print(f"[..] génération {titles} titres / {drugs} médicaments → {data_dir}")
+            generate(data_dir, titles, drugs, args.seed)
+
+    print(f"[..] benchmarks sur {data_dir}")
+    results = run_all(data_dir, args.repeat, set(args.only) if args.only else None)
+    report = {"scale": label, "titles": titles, "drugs": drugs, "seed": args.seed,
+              "python": platform.python_version(), "pandas": pd.__version__,
+              "machine": platform.machine(), "results": results}
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out_fp = args.output or RESULTS_DIR / f"{label}.json"
+    out_fp.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[ok] résultats → {out_fp}")
+
+    baseline_fp = args.baseline or RESULTS_DIR / f"baseline_{label}.json"
+    if args.save_baseline:
+        baseline_fp.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"[ok] baseline enregistrée → {baseline_fp}")
+        return
+    if not baseline_fp.exists():
+        print(f"[warn] pas de baseline ({baseline_fp}) : --save-baseline pour en créer une")
+        return
+    issues = compare(results, json.loads(baseline_fp.read_text(encoding="utf-8"))["results"], args.threshold)
+    for msg in issues:
+        print(f"[warn] régression {msg}")
+    if issues:
+        sys.exit(1)
+    print(f"[ok] aucune régression (tolérance {args.threshold:.0%})")
+
+if __name__ == "__main__":
+    main()
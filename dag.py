@@ -1,38 +1,35 @@
 # dag.py — etl_drug_mentions : 3 tasks (extract -> transform -> load)
 from __future__ import annotations
-import importlib.util, sys
+import sys
 from datetime import datetime, timedelta
 from pathlib import Path
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 
-DAG_ID  = "etl_drug_mentions"
-DAG_DIR = Path(__file__).resolve().parent
-RUN_PY  = DAG_DIR / "run.py"   
-
-def _load_run_module():
-    """Charge run.py par chemin et renvoie le module importé."""
-    if not RUN_PY.exists():
-        raise FileNotFoundError(f"run.py introuvable: {RUN_PY}")
-    spec = importlib.util.spec_from_file_location("run_module", str(RUN_PY))
-    mod = importlib.util.module_from_spec(spec)
-    sys.modules["run_module"] = mod
-    assert spec and spec.loader
-    spec.loader.exec_module(mod)
-    return mod
+DAG_ID   = "etl_drug_mentions"
+DAG_DIR  = Path(__file__).resolve().parent
+SRC_DIR  = DAG_DIR / "src"
+DATA_DIR = DAG_DIR / "Data"
+OUT_DIR  = DAG_DIR / "outputs"
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
+
+# Import léger (stdlib seulement) : pandas n'est chargé que par la tâche transform
+from test_pipline import tasks
 
 def py_extract(**_):
-    mod = _load_run_module()
-    return mod.extract()
+    return tasks.extract(DATA_DIR)
 
 def py_transform(**_):
-    mod = _load_run_module()
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
     # dayfirst=True : format EU (jour/mois/année) ; change à False si sources US
-    return mod.transform(dayfirst=True, generate_auto_id_if_empty=True)
+    # incremental=True : seules les publications/médicaments ajoutés depuis le run précédent sont matchés
+    return tasks.transform(DATA_DIR, OUT_DIR, dayfirst=True, generate_auto_id_if_empty=True, incremental=True)
 
-def py_load(**_):
-    mod = _load_run_module()
-    return mod.load()
+def py_load(ti=None, **_):
+    # Index journal -> nb de médicaments calculé par transform (XCom) : pas de relecture du JSON complet
+    res = ti.xcom_pull(task_ids="transform_data") if ti is not None else None
+    return tasks.load(OUT_DIR, (res or {}).get("journal_index"))
 
 default_args = {
     "owner": "airflow",
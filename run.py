@@ -1,7 +1,7 @@
 # run.py — test_pipline (ETL callable par Airflow ou en CLI)
 from __future__ import annotations
 from pathlib import Path
-import sys, json, csv
+import sys
 from argparse import ArgumentParser
 
 
@@ -15,62 +15,37 @@ if str(SRC_DIR) not in sys.path:
     sys.path.append(str(SRC_DIR))
 
 
-from test_pipline.config import Config
-from test_pipline.pipeline import run_pipeline
+from test_pipline import tasks
 
 def extract() -> dict:
     """Vérifie la présence des fichiers d'entrée requis."""
-    required = ["drugs.csv", "clinical_trials.csv"]
-    missing = [n for n in required if not (DATA_DIR / n).exists()]
-    has_pubmed = (DATA_DIR / "pubmed.csv").exists() or (DATA_DIR / "pubmed.json").exists()
-    if missing or not has_pubmed:
-        raise FileNotFoundError(
-            f"Fichiers manquants: {missing}; pubmed présent ? {has_pubmed}. "
-            f"Attendus dans {DATA_DIR}"
-        )
-    present = sorted(p.name for p in DATA_DIR.glob("*") if p.is_file())
-    print(f"[extract] OK — présents: {present}")
-    return {"present": present}
+    return tasks.extract(DATA_DIR)
 
-def transform(dayfirst: bool = True, generate_auto_id_if_empty: bool = True) -> dict:
-    """Exécute la pipeline et produit outputs/drug_publications_by_atc.json"""
-    cfg = Config(
-        data_dir=DATA_DIR,
-        out_dir=OUT_DIR,
-        parse_dayfirst=dayfirst,
-        generate_auto_id_if_empty=generate_auto_id_if_empty,
-    )
-    run_pipeline(cfg)
-    out_file = OUT_DIR / "drug_publications_by_atc.json"
-    if not out_file.exists():
-        raise FileNotFoundError(out_file)
-    print(f"[transform] JSON écrit -> {out_file}")
-    return {"out_file": str(out_file)}
+def transform(dayfirst: bool = True, generate_auto_id_if_empty: bool = True,
+              chunk_size: int | None = None, workers: int = 1, io_threads: int = 4, incremental: bool = False,
+              output_format: str = "pretty", output_layout: str = "single", profile: str | None = None,
+              trace_memory: bool = False) -> dict:
+    """Exécute la pipeline et produit outputs/drug_publications_by_atc.json
+    chunk_size : lecture streaming par blocs de N lignes (None = tout en mémoire).
+    workers    : processus de matching (1 = série, 0 = nb de cœurs).
+    io_threads : threads de lecture concurrente des sources (1 = séquentiel).
+    incremental: ne matcher que les nouveautés (état dans outputs/incremental_state.sqlite).
+    output_format : "pretty" (indent=2), "compact" ou "ndjson" (.ndjson, un ATC par ligne).
+    output_layout : "single" (un fichier), "partitioned" (outputs/by_atc/<lettre ATC> + manifeste) ou "both".
+    profile    : None, "cprofile" ou "sample" ; trace_memory : pic tracemalloc par étape.
+    Les métriques du run (outputs/run_metrics.json) et le chemin de l'index des journaux
+    sont renvoyés dans le dict (XCom)."""
+    return tasks.transform(DATA_DIR, OUT_DIR, dayfirst=dayfirst, generate_auto_id_if_empty=generate_auto_id_if_empty,
+                           chunk_size=chunk_size, workers=workers, io_threads=io_threads,
+                           incremental=incremental, output_format=output_format, output_layout=output_layout,
+                           profile=profile, trace_memory=trace_memory)
 
-def load() -> dict:
-    """Post-traitement : calcule le(s) journal(aux) citant le plus de médicaments distincts et exporte un CSV."""
-    out_file = OUT_DIR / "drug_publications_by_atc.json"
-    data = json.loads(out_file.read_text(encoding="utf-8"))
-
-    journal_to_drugs: dict[str, set] = {}
-    for atc, obj in data.items():
-        for j in obj.get("journals", []) or []:
-            name = j["journal"] if isinstance(j, dict) else j
-            if name:
-                journal_to_drugs.setdefault(name, set()).add(atc)
-
-    rows = sorted(((j, len(s)) for j, s in journal_to_drugs.items()),
-                  key=lambda x: (-x[1], x[0]))
-
-    csv_path = OUT_DIR / "journal_drug_coverage.csv"
-    with csv_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["journal", "distinct_drugs"])
-        w.writerows(rows)
-
-    top = rows[0] if rows else ("N/A", 0)
-    print(f"[load] Top journal: {top[0]} — {top[1]} médicaments distincts")
-    return {"csv_path": str(csv_path), "top_journal": top[0], "count": top[1]}
+def load(journal_index: str | None = None, top_k: int = 1, source: str | None = None,
+         start: str | None = None, end: str | None = None, atc_prefix: list[str] | None = None) -> dict:
+    """Post-traitement : calcule le(s) journal(aux) citant le plus de médicaments distincts et exporte un CSV.
+    source ("pubmed" / "clinical_trial"), start / end (dates ISO) et atc_prefix (codes ATC retenus) :
+    classement filtré."""
+    return tasks.load(OUT_DIR, journal_index, top_k=top_k, source=source, start=start, end=end, atc_prefix=atc_prefix)
 
 # Option : exécution en CLI locale (python run.py [extract|transform|load|all])
 if __name__ == "__main__":
@@ -78,7 +53,26 @@ if __name__ == "__main__":
     p.add_argument("step", nargs="?", choices=["extract","transform","load","all"], default="all")
     p.add_argument("--dayfirst", action="store_true")
     p.add_argument("--no-auto-id", action="store_true")
+    p.add_argument("--chunk-size", type=int, default=None, help="lecture streaming par blocs de N lignes")
+    p.add_argument("--workers", type=int, default=1, help="processus de matching (0 = nb de cœurs)")
+    p.add_argument("--io-threads", type=int, default=4, help="lecture concurrente des sources (1 = séquentiel)")
+    p.add_argument("--incremental", action="store_true", help="ne retraiter que les nouveautés depuis le dernier run")
+    p.add_argument("--output-format", choices=["pretty", "compact", "ndjson"], default="pretty")
+    p.add_argument("--output-layout", choices=["single", "partitioned", "both"], default="single",
+                   help="un fichier, un fichier par groupe ATC (outputs/by_atc/) ou les deux")
+    p.add_argument("--profile", choices=["cprofile", "sample"], default=None, help="profilage du transform")
+    p.add_argument("--trace-memory", action="store_true", help="pic mémoire Python par étape (tracemalloc)")
+    p.add_argument("--top-k", type=int, default=1, help="load : nb de journaux rapportés")
+    p.add_argument("--source", choices=["pubmed", "clinical_trial"], default=None, help="load : une seule source")
+    p.add_argument("--from", dest="start", default=None, help="load : début de fenêtre (date ISO)")
+    p.add_argument("--to", dest="end", default=None, help="load : fin de fenêtre (date ISO)")
+    p.add_argument("--atc-prefix", nargs="+", default=None, help="load : codes ATC retenus (ex. N A04)")
     args = p.parse_args()
     if args.step in ("extract","all"): extract()
-    if args.step in ("transform","all"): transform(dayfirst=args.dayfirst, generate_auto_id_if_empty=not args.no_auto_id)
-    if args.step in ("load","all"): load()
+    if args.step in ("transform","all"): transform(dayfirst=args.dayfirst, generate_auto_id_if_empty=not args.no_auto_id,
+                                                   chunk_size=args.chunk_size, workers=args.workers, io_threads=args.io_threads,
+                                                   incremental=args.incremental, output_format=args.output_format,
+                                                   output_layout=args.output_layout,
+                                                   profile=args.profile, trace_memory=args.trace_memory)
+    if args.step in ("load","all"): load(top_k=args.top_k, source=args.source, start=args.start, end=args.end,
+                                         atc_prefix=args.atc_prefix)
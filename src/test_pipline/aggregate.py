@@ -1,81 +1,159 @@
 from __future__ import annotations
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Iterator, Tuple
+import numpy as np
 import pandas as pd
-from .clean import fix_mojibake, safe_date, safe_id, make_pub_id
+from .clean import fix_mojibake, fix_mojibake_series, normalize_dates, safe_id, make_pub_id
+from .match import CompactEdges
 
-def _journal_summary(g: pd.DataFrame) -> List[dict]:
-    """Pour un groupe (médicament), résume les journaux avec date et compte :
+def _map_unique(s: pd.Series, fn: Callable, na_value=None) -> pd.Series:
+    """Applique `fn` une seule fois par valeur distincte de `s` ; les manquants -> `na_value`.
+    Renvoie une Series object (None conservé tel quel, pas de conversion en NaN)."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    mapped = [fn(v) for v in uniques]
+    return pd.Series([na_value if c < 0 else mapped[c] for c in codes], index=s.index, dtype=object)
+
+def _summary_journal(j):
+    """Clé journal du résumé : strip + fix_mojibake (après la normalisation des lignes)."""
+    return fix_mojibake(j.strip()) if isinstance(j, str) else None
+
+def _journal_summaries(e: pd.DataFrame) -> Iterator[Tuple[tuple, List[dict]]]:
+    """Résume, en un seul groupby, les journaux de chaque (ATC, médicament) ;
+    renvoie ((ATC, médicament), journaux) dans l'ordre trié des groupes :
     - first_date : première date observée pour ce (journal, médicament)
     - last_date  : dernière date observée
     - n_pubs     : nb de publications DISTINCTES (pub_id) pour ce couple
     """
-    df = g.dropna(subset=["journal"]).copy()
-    df["journal"] = df["journal"].map(lambda x: x.strip() if isinstance(x, str) else None)
-    df["journal"] = df["journal"].map(fix_mojibake)
-    df["date_parsed"] = pd.to_datetime(df["date"], errors="coerce")
-
-    agg = (df.groupby("journal", as_index=False)
-             .agg(first_date=("date_parsed","min"),
-                  last_date =("date_parsed","max"),
-                  n_pubs    =("pub_id","nunique")))
+    df = e.loc[e["journal_summary"].notna(), ["drug_atccode", "drug_name", "journal_summary", "date_parsed", "pub_id"]]
+    agg = (df.groupby(["drug_atccode", "drug_name", "journal_summary"], sort=True, dropna=False)
+             .agg(first_date=("date_parsed", "min"),
+                  last_date =("date_parsed", "max"),
+                  n_pubs    =("pub_id", "nunique"))
+             .reset_index())
 
     # Convertir en texte ISO et forcer None si manquant (évite NaN/NaT dans le JSON)
     for col in ("first_date", "last_date"):
         s = agg[col].dt.strftime("%Y-%m-%d")
-        agg[col] = s.where(s.notna(), None)
-
-    # n_pubs en int Python
-    agg["n_pubs"] = agg["n_pubs"].fillna(0).astype(int)
+        agg[col] = s.astype(object).where(s.notna(), None)
 
-    agg = agg.sort_values("journal", kind="stable")
-
-    out: List[dict] = []
+    key, items = None, []
     for r in agg.itertuples(index=False):
-        out.append({
-            "journal": r.journal,
+        if (r.drug_atccode, r.drug_name) != key:
+            if items:
+                yield key, items
+            key, items = (r.drug_atccode, r.drug_name), []
+        items.append({
+            "journal": r.journal_summary,
             "first_date": r.first_date,   # str "YYYY-MM-DD" ou None
             "last_date": r.last_date,     # str "YYYY-MM-DD" ou None
             "n_pubs": int(r.n_pubs)
         })
-    return out
+    if items:
+        yield key, items
 
-def build_by_atc(edges: pd.DataFrame, generate_auto_id_if_empty: bool) -> Dict[str, Any]:
-    """Construit le JSON final groupé par ATC.
-    - 'pubmed' et 'clinical_trials' : listes d'objets {id, title, date, journal}
-    - 'journals' : liste d'objets {journal, first_date, last_date, n_pubs}
+def _row_order(e: pd.DataFrame) -> np.ndarray:
+    """Ordre de sortie des lignes : groupes (ATC, médicament) triés, puis date (NaT en dernier).
+    Le tri par date reprend l'argsort quicksort de `sort_values` appliqué à chaque groupe,
+    pour conserver exactement l'ordre des ex-aequo de la version groupe par groupe.
     """
-    e = edges.copy()
-    for col in ("journal","title"):
-        e[col] = e[col].map(fix_mojibake)
-    e["date_parsed"] = pd.to_datetime(e["date"], errors="coerce")
+    if e.empty:
+        return np.arange(0)
+    gid = e.groupby(["drug_atccode", "drug_name"], sort=True, dropna=False).ngroup().to_numpy()
+    by_group = np.argsort(gid, kind="stable")
+    bounds = np.flatnonzero(np.diff(gid[by_group])) + 1
+    nat = e["date_parsed"].isna().to_numpy()
+    dates = e["date_parsed"].to_numpy()
+    parts = []
+    for idx in np.split(by_group, bounds):
+        ok = idx[~nat[idx]]
+        parts.append(ok[np.argsort(dates[ok], kind="quicksort")])
+        parts.append(idx[nat[idx]])
+    return np.concatenate(parts)
 
-    out: Dict[str, Any] = {}
-    for (atc, drug), g in e.groupby(["drug_atccode","drug_name"], dropna=False):
-        g = g.sort_values("date_parsed", na_position="last")
+def _as_compact(edges: pd.DataFrame | CompactEdges) -> CompactEdges:
+    """Edges longs (find_mentions) vus comme des edges compacts : une publication par ligne."""
+    if isinstance(edges, CompactEdges):
+        return edges
+    idx = np.arange(len(edges), dtype=np.int32)
+    pubs = edges[["source", "pub_id", "title", "journal", "date"]].reset_index(drop=True)
+    drugs = pd.DataFrame({"atccode": edges["drug_atccode"].to_numpy(dtype=object),
+                          "drug": edges["drug_name"].to_numpy(dtype=object)})
+    return CompactEdges(pubs, drugs, idx, idx)
 
-        def rows_for(src: str):
-            items = []
-            gf = g[g["source"].eq(src)]
-            for r in gf.itertuples(index=False):
-                rid = safe_id(r.pub_id)
-                rdate = safe_date(r.date)
-                # Normaliser journal/title pour éviter des NaN JSON
-                rjournal = r.journal if (r.journal is not None and not (isinstance(r.journal,float) and pd.isna(r.journal))) else None
-                rtitle = r.title if (r.title is not None and not (isinstance(r.title,float) and pd.isna(r.title))) else ""
-                if rid is None and generate_auto_id_if_empty:
-                    rid = make_pub_id(rtitle, rjournal or "", rdate)
-                items.append({"id": rid, "title": rtitle, "date": rdate, "journal": rjournal})
-            return items
+def _edge_frame(edges: pd.DataFrame | CompactEdges, generate_auto_id_if_empty: bool) -> pd.DataFrame:
+    """Colonnes normalisées par mention. La normalisation (journal, titre, id, date, ID auto) est
+    faite une fois par publication citée ; les titres ne sont matérialisés par mention qu'ici,
+    par indexation (références vers les mêmes objets, pas de copie des chaînes)."""
+    c = _as_compact(edges)
+    p = pd.DataFrame(index=c.pubs.index)
+    p["source"] = c.pubs["source"].to_numpy(dtype=object)
+    pub_id = pd.Series(c.pubs["pub_id"].to_numpy(dtype=object), index=p.index)
+    p["pub_id"] = pub_id.where(pub_id.notna(), None)
+    # Normaliser journal/title pour éviter des NaN JSON
+    p["journal"] = fix_mojibake_series(c.pubs["journal"])
+    p["journal_summary"] = _map_unique(p["journal"], _summary_journal)
+    title = fix_mojibake_series(c.pubs["title"])
+    p["title"] = title.where(title.notna(), "")
+    p["rid"] = _map_unique(p["pub_id"], safe_id)
+    # 'date' est déjà la colonne ISO de add_iso_date : parsée une fois par valeur distincte (cache)
+    p["date_parsed"], rdate = normalize_dates(c.pubs["date"], dayfirst=False)
+    p["rdate"] = rdate.where(rdate.notna(), None)
+
+    # IDs auto déjà attribués par l'étape d'identité en amont ; ne reste que les publications sans id
+    missing = np.flatnonzero(p["rid"].isna().to_numpy())
+    if generate_auto_id_if_empty and len(missing):
+        rid = p["rid"].tolist()
+        title, journal, rdate = p["title"].tolist(), p["journal"].tolist(), p["rdate"].tolist()
+        for i in missing.tolist():
+            rid[i] = make_pub_id(title[i], journal[i] or "", rdate[i])
+        p["rid"] = pd.Series(rid, index=p.index, dtype=object)
+
+    e = p.iloc[c.pub].reset_index(drop=True)
+    e.insert(0, "drug_atccode", c.drugs["atccode"].to_numpy(dtype=object)[c.drug])
+    e.insert(1, "drug_name", c.drugs["drug"].to_numpy(dtype=object)[c.drug])
+    return e
+
+def iter_by_atc(edges: pd.DataFrame | CompactEdges, generate_auto_id_if_empty: bool) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Produit les entrées (code ATC, objet) du JSON final, dans l'ordre, dès qu'elles sont complètes.
+    - 'pubmed' et 'clinical_trials' : listes d'objets {id, title, date, journal}
+    - 'journals' : liste d'objets {journal, first_date, last_date, n_pubs}
+    Normalisation colonne par colonne (une fois par valeur distincte), puis un seul
+    passage sur les lignes ordonnées par (ATC, médicament, date). Les valeurs manquantes
+    sont déjà None : aucune passe de nettoyage NaN n'est nécessaire en aval.
+    Si un ATC porte plusieurs médicaments, seul le dernier (ordre trié) est conservé.
+    """
+    e = _edge_frame(edges, generate_auto_id_if_empty)
+    e = e.iloc[_row_order(e)]
 
-        pubmed = rows_for("pubmed")
-        clinical = rows_for("clinical_trial")
-        journals = _journal_summary(g)
+    journals = _journal_summaries(e)
+    next_journals = next(journals, None)
+    pending = None
+    current = None
+    for r in e[["drug_atccode", "drug_name", "source", "rid", "title", "rdate", "journal"]].itertuples(index=False):
+        key = (r.drug_atccode, r.drug_name)
+        if key != current:
+            current = key
+            atc, drug = key
+            entry_journals = []
+            if next_journals is not None and next_journals[0] == key:
+                entry_journals = next_journals[1]
+                next_journals = next(journals, None)
+            entry = {
+                "drug": str(drug) if drug is not None else None,
+                "atccode": str(atc) if atc is not None else None,
+                "pubmed": [],
+                "clinical_trials": [],
+                "journals": entry_journals
+            }
+            # les groupes d'un même ATC sont consécutifs : on n'émet qu'au changement d'ATC
+            if pending is not None and pending[0] != str(atc):
+                yield pending
+            pending = (str(atc), entry)
+        items = entry["pubmed"] if r.source == "pubmed" else entry["clinical_trials"] if r.source == "clinical_trial" else None
+        if items is not None:
+            items.append({"id": r.rid, "title": r.title, "date": r.rdate, "journal": r.journal})
+    if pending is not None:
+        yield pending
 
-        out[str(atc)] = {
-            "drug": str(drug) if drug is not None else None,
-            "atccode": str(atc) if atc is not None else None,
-            "pubmed": pubmed,
-            "clinical_trials": clinical,
-            "journals": journals
-        }
-    return out
+def build_by_atc(edges: pd.DataFrame | CompactEdges, generate_auto_id_if_empty: bool) -> Dict[str, Any]:
+    """Construit le JSON final groupé par ATC (voir iter_by_atc)."""
+    return dict(iter_by_atc(edges, generate_auto_id_if_empty))
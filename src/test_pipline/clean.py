@@ -1,25 +1,119 @@
 from __future__ import annotations
-import re, unicodedata, hashlib
+import re, unicodedata, hashlib, warnings
+from datetime import date
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 
 _HEXSEQ = re.compile(r"(?:\\x[0-9A-Fa-f]{2})+")
+_HEXBYTE = re.compile(r"\\x([0-9A-Fa-f]{2})")
+
+# Année en tête (2020-01-02, 2020/01/02, 20200102, heure et fuseau éventuels) : jamais lue jour-en-premier
+_YEAR_FIRST = re.compile(r"(\d{4})(?:-(\d{1,2})-(\d{1,2})|/(\d{1,2})/(\d{1,2})|(\d{2})(\d{2}))"
+                         r"(?:[T ](\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?))?\s*(?:Z|[+-]\d{2}:?\d{2})?")
+# Formats rapides (regex -> format strptime) ; le reste passe par le parsing dateutil de pandas
+_SLASH_DATE = re.compile(r"\d{1,2}/\d{1,2}/\d{4}")
+_LONG_DATE = re.compile(r"\d{1,2} [A-Za-z]+ \d{4}")
+_DATE_CACHE: dict[tuple[str, bool], pd.Timestamp] = {}
+_DATE_CACHE_MAX = 1 << 18
+
+def _dec(m: re.Match) -> str:
+    bs = bytes(int(h, 16) for h in _HEXBYTE.findall(m.group(0)))
+    try: return bs.decode("utf-8")
+    except UnicodeDecodeError: return ""
+
+@lru_cache(maxsize=1 << 16)
+def _fix_mojibake_str(s: str) -> str:
+    s = _HEXSEQ.sub(_dec, s)
+    return unicodedata.normalize("NFKC", s).strip()
 
 def fix_mojibake(s: str | None) -> str | None:
-    r"""Corrige séquences '\\xNN' et normalise en NFKC (évite doublons de journaux)."""
+    r"""Corrige séquences '\\xNN' et normalise en NFKC (évite doublons de journaux).
+    Chemin rapide pour l'ASCII pur sans '\x' (NFKC sans effet) ; sinon résultat mémoïsé (LRU)."""
     if s is None: return None
     s = str(s)
-    def _dec(m):
-        bs = bytes(int(h,16) for h in re.findall(r"\\x([0-9A-Fa-f]{2})", m.group(0)))
-        try: return bs.decode("utf-8")
-        except UnicodeDecodeError: return ""
-    s = _HEXSEQ.sub(_dec, s)
-    return unicodedata.normalize("NFKC", s).strip()
+    if s.isascii() and "\\x" not in s:
+        return s.strip()
+    return _fix_mojibake_str(s)
+
+def normalize_text(s: str | None) -> str:
+    """Forme de comparaison d'un texte (titres, noms de médicaments) : séquences '\\xNN'
+    corrigées, NFKC, casse repliée (casefold, 'İ' -> 'i'). Non mémoïsée (une fois par titre)."""
+    if not s: return ""
+    s = str(s)
+    if not s.isascii() or "\\x" in s:
+        s = unicodedata.normalize("NFKC", _HEXSEQ.sub(_dec, s))
+    return s.casefold().replace("i\u0307", "i")
+
+def fix_mojibake_series(values: pd.Series) -> pd.Series:
+    """fix_mojibake sur une colonne : une seule correction par valeur distincte.
+    Renvoie une Series object ; les valeurs manquantes donnent None."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    fixed = np.array([fix_mojibake(u) for u in uniques] + [None], dtype=object)
+    return pd.Series(fixed[codes], index=values.index, name=values.name, dtype=object)
+
+def _date_formats(dayfirst: bool):
+    return ((_SLASH_DATE, "%d/%m/%Y" if dayfirst else "%m/%d/%Y"),
+            (_LONG_DATE, "%d %B %Y"))
+
+def _iso_form(m: re.Match) -> str:
+    """Forme ISO (heure locale, fuseau ignoré comme dans le repli dateutil) d'une date année en tête."""
+    y, *md, t = m.groups()
+    month, day = next((md[i], md[i + 1]) for i in (0, 2, 4) if md[i] is not None)
+    return f"{y}-{month}-{day}" + (f" {t}" if t else "")
+
+def _parse_distinct(raws: list[str], dayfirst: bool) -> list:
+    """Parse des chaînes distinctes : cache, puis dates année en tête (ISO 8601, quel que soit
+    dayfirst), puis formats rapides vectorisés, puis dateutil."""
+    out = {r: _DATE_CACHE[(r, dayfirst)] for r in raws if (r, dayfirst) in _DATE_CACHE}
+    todo = [r for r in raws if r not in out]
+    iso = {r: _iso_form(m) for r in todo if (m := _YEAR_FIRST.fullmatch(r))}
+    if iso:
+        parsed = pd.to_datetime(pd.Series(list(iso.values()), dtype=object), format="ISO8601", errors="coerce")
+        out.update((r, ts) for r, ts in zip(iso, parsed) if not pd.isna(ts))
+        todo = [r for r in todo if r not in out]
+    for pat, fmt in _date_formats(dayfirst):
+        cand = [r for r in todo if pat.fullmatch(r)]
+        if cand:
+            parsed = pd.to_datetime(pd.Series(cand, dtype=object), format=fmt, errors="coerce")
+            out.update((r, ts) for r, ts in zip(cand, parsed) if not pd.isna(ts))
+            todo = [r for r in todo if r not in out]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for r in todo:
+            ts = pd.to_datetime(r, dayfirst=dayfirst, errors="coerce")
+            out[r] = ts.tz_localize(None) if not pd.isna(ts) and ts.tzinfo else ts
+    if len(_DATE_CACHE) + len(out) > _DATE_CACHE_MAX:
+        _DATE_CACHE.clear()
+    _DATE_CACHE.update(((r, dayfirst), ts) for r, ts in out.items())
+    return [out[r] for r in raws]
+
+def _naive(ts: pd.Timestamp) -> pd.Timestamp:
+    return ts.tz_localize(None) if ts.tzinfo else ts
+
+def normalize_dates(values: pd.Series, dayfirst: bool) -> tuple[pd.Series, pd.Series]:
+    """Parse une colonne de dates hétérogènes ('1 January 2020', '01/01/2019', ISO...).
+    Chaque valeur distincte n'est parsée qu'une fois (cache partagé entre appels/blocs) ;
+    les valeurs déjà datées (Timestamp, datetime64, date, ex. colonne Parquet) sont reprises telles quelles.
+    Renvoie (dates datetime64, dates ISO 'YYYY-MM-DD' ou NaN).
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    dated = (date, np.datetime64)
+    raws = [str(u).strip() for u in uniques if not isinstance(u, dated)]
+    from_raws = iter(_parse_distinct(raws, dayfirst))
+    distinct = [_naive(pd.Timestamp(u)) if isinstance(u, dated) else next(from_raws) for u in uniques]
+    parsed = pd.to_datetime(pd.Series(distinct, dtype=object), errors="coerce")
+    iso = parsed.dt.strftime("%Y-%m-%d").astype(object)
+    # code -1 (valeur manquante) -> dernier élément ajouté (NaT / NaN)
+    dates = np.append(parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))[codes]
+    iso = np.append(iso.where(iso.notna(), np.nan).to_numpy(dtype=object), np.nan)[codes]
+    return (pd.Series(dates, index=values.index, name=values.name),
+            pd.Series(iso, index=values.index, name=values.name, dtype=object))
 
 def add_iso_date(df: pd.DataFrame, dayfirst: bool) -> pd.DataFrame:
-    """Ajoute une colonne 'date_iso' (YYYY-MM-DD) après parsing robuste."""
+    """Ajoute une colonne 'date_iso' (YYYY-MM-DD) après parsing robuste (une fois par valeur distincte)."""
     df = df.copy()
-    df["date"] = pd.to_datetime(df["date"], dayfirst=dayfirst, errors="coerce")
-    df["date_iso"] = df["date"].dt.strftime("%Y-%m-%d")
+    df["date"], df["date_iso"] = normalize_dates(df["date"], dayfirst=dayfirst)
     return df
 
 def safe_date(v) -> str | None:
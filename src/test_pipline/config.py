@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+import os
 
 @dataclass
 class Config:
@@ -8,14 +9,55 @@ class Config:
     out_dir: Path
     parse_dayfirst: bool = True                  # Interpréter dates ambiguës en mode EU
     generate_auto_id_if_empty: bool = True       # Générer un ID si publication sans ID
+    dedup_publications: bool = True              # Retirer les doublons (même id, ou même titre/journal/date)
+    chunk_size: int | None = None                # Lecture streaming par blocs de N lignes (None = tout en mémoire)
+    io_threads: int = 4                          # Lecture concurrente des sources + matcher (1 = séquentiel)
+    workers: int = 1                             # Processus de matching (1 = série, 0 = nb de cœurs)
+    incremental: bool = False                    # Ne matcher que les publications/médicaments nouveaux
+    output_format: str = "pretty"                # "pretty" (indent=2), "compact" ou "ndjson" (un ATC par ligne)
+    output_layout: str = "single"                # "single" (un fichier), "partitioned" (un fichier par 1re lettre ATC + manifeste) ou "both"
+    columnar_output: bool = True                 # Écrire aussi edges/journaux en Parquet (si pyarrow installé)
+    matcher_cache: bool = True                   # Réutiliser le matcher compilé (cache clé = contenu de drugs)
+    journal_index: bool = True                   # Écrire l'index journal -> nb de médicaments (lu par load)
+    query_store: bool = True                     # Écrire le store SQLite interrogeable (drugs, publications, edges, journaux)
+    profile: str | None = None                   # Profilage du run : None, "cprofile" ou "sample"
+    trace_memory: bool = False                   # Pic mémoire Python par étape via tracemalloc (plus lent)
 
     @property
-    def drugs_fp(self) -> Path: return self.data_dir / "drugs.csv"
+    def n_workers(self) -> int: return self.workers if self.workers > 0 else (os.cpu_count() or 1)
+
+    def _input(self, stem: str) -> Path:
+        """<stem>.parquet s'il existe dans data_dir, sinon <stem>.csv."""
+        pq = self.data_dir / f"{stem}.parquet"
+        return pq if pq.exists() else self.data_dir / f"{stem}.csv"
+
+    @property
+    def drugs_fp(self) -> Path: return self._input("drugs")
     @property
     def pubmed_csv_fp(self) -> Path: return self.data_dir / "pubmed.csv"
     @property
     def pubmed_json_fp(self) -> Path: return self.data_dir / "pubmed.json"
     @property
-    def ctrials_fp(self) -> Path: return self.data_dir / "clinical_trials.csv"
+    def pubmed_parquet_fp(self) -> Path: return self.data_dir / "pubmed.parquet"
+    @property
+    def ctrials_fp(self) -> Path: return self._input("clinical_trials")
+    @property
+    def by_atc_json_fp(self) -> Path:
+        ext = "ndjson" if self.output_format == "ndjson" else "json"
+        return self.out_dir / f"drug_publications_by_atc.{ext}"
+    @property
+    def partition_dir(self) -> Path: return self.out_dir / "by_atc"
+    @property
+    def edges_parquet_fp(self) -> Path: return self.out_dir / "edges.parquet"
+    @property
+    def journals_parquet_fp(self) -> Path: return self.out_dir / "journal_summary.parquet"
+    @property
+    def cache_dir(self) -> Path: return self.out_dir / ".cache"
+    @property
+    def journal_index_fp(self) -> Path: return self.out_dir / "journal_index.json"
+    @property
+    def store_fp(self) -> Path: return self.out_dir / "drug_publications.sqlite"
+    @property
+    def metrics_fp(self) -> Path: return self.out_dir / "run_metrics.json"
     @property
-    def by_atc_json_fp(self) -> Path: return self.out_dir / "drug_publications_by_atc.json"
+    def state_fp(self) -> Path: return self.out_dir / "incremental_state.sqlite"
@@ -0,0 +1,69 @@
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from .clean import fix_mojibake_series, safe_id, make_pub_id
+
+def _distinct(values: pd.Series, fn) -> list:
+    """`fn` appliquée une fois par valeur distincte ; les manquants passent None à `fn`."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    mapped = np.array([fn(u) for u in uniques] + [fn(None)], dtype=object)
+    return mapped[codes].tolist()
+
+def _norm_text(s: str | None) -> str:
+    return " ".join(s.casefold().split()) if s else ""
+
+def _norm_id(v) -> str | None:
+    """Identifiant normalisé (texte), None si absent. Un id flottant entier (colonne CSV
+    avec des manquants, ex. 14.0) redevient "14", comme en lecture par blocs."""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    rid = safe_id(str(v).strip())
+    return None if rid is None else str(rid)
+
+def publication_keys(df: pd.DataFrame) -> tuple[np.ndarray, list, list, list]:
+    """Clé canonique (uint64) par ligne, calculée colonne par colonne :
+    - identifiant normalisé s'il existe ("1", 1 et " 1" sont la même publication) ;
+    - sinon empreinte de (titre, journal, date ISO) normalisés (mojibake, casse, espaces).
+    Renvoie aussi (ids normalisés, titres, journaux) corrigés, réutilisés pour les IDs auto.
+    """
+    n = len(df)
+    col = lambda c: df[c] if c in df else pd.Series([None] * n, index=df.index, dtype=object)
+    ids = _distinct(col("id"), _norm_id)
+    titles = fix_mojibake_series(col("title").astype(object)).tolist()
+    journals = fix_mojibake_series(col("journal").astype(object)).tolist()
+    ntitles = _distinct(pd.Series(titles, dtype=object), _norm_text)
+    njournals = _distinct(pd.Series(journals, dtype=object), _norm_text)
+    dates = col("date_iso").astype(object).where(col("date_iso").notna(), "").tolist()
+    keys = [f"i\x1f{i}" if i is not None else f"t\x1f{t}\x1f{j}\x1f{d}"
+            for i, t, j, d in zip(ids, ntitles, njournals, dates)]
+    h = pd.util.hash_pandas_object(pd.Series(keys, dtype=object), index=False).to_numpy(dtype="uint64")
+    return h, ids, titles, journals
+
+def dedup_publications(df: pd.DataFrame, seen: set, generate_auto_id_if_empty: bool) -> tuple[pd.DataFrame, int]:
+    """Étape d'identité avant matching : ne garde que la première occurrence de chaque clé
+    canonique (dans le bloc et par rapport à `seen`, index des clés déjà vues pour cette source,
+    mis à jour), écrit l'id normalisé et attribue les IDs auto (make_pub_id) aux publications
+    sans identifiant.
+    Renvoie (publications conservées, nb de doublons retirés).
+    """
+    if df.empty:
+        return df, 0
+    keys, ids, titles, journals = publication_keys(df)
+    keep = ~pd.Series(keys).duplicated().to_numpy()
+    if seen:
+        keep &= np.fromiter((k not in seen for k in keys.tolist()), dtype=bool, count=len(keys))
+    seen.update(keys[keep].tolist())
+
+    kept = np.flatnonzero(keep).tolist()
+    out = df.iloc[kept].copy()
+    new_ids = [ids[p] for p in kept]
+    if generate_auto_id_if_empty:
+        dates = out["date_iso"].tolist() if "date_iso" in out else [None] * len(out)
+        for k, p in enumerate(kept):
+            if new_ids[k] is None:
+                d = dates[k] if isinstance(dates[k], str) else None
+                new_ids[k] = make_pub_id(titles[p] or "", journals[p] or "", d)
+    out["id"] = pd.Series(new_ids, index=out.index, dtype=object)
+    return out, int(len(df) - keep.sum())
@@ -0,0 +1,199 @@
+from __future__ import annotations
+import json, sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Tuple
+import pandas as pd
+from .aggregate import iter_by_atc
+from .match import (EDGE_COLUMNS, build_patterns, build_matcher, find_mentions,
+                    matcher_cache_fp, load_or_build_matcher)
+
+STATE_VERSION = "4"
+SOURCE_RANK = {"pubmed": 0, "clinical_trial": 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS drugs (drug_id INTEGER PRIMARY KEY AUTOINCREMENT, atccode TEXT, drug TEXT,
+                                  n INTEGER, pos INTEGER, rev INTEGER, UNIQUE (atccode, drug));
+CREATE TABLE IF NOT EXISTS pubs (h INTEGER PRIMARY KEY, rev INTEGER);
+CREATE TABLE IF NOT EXISTS edges (h INTEGER, drug_id INTEGER, source TEXT, pub_id TEXT,
+                                  title TEXT, journal TEXT, date TEXT);
+CREATE INDEX IF NOT EXISTS edges_h ON edges (h);
+CREATE INDEX IF NOT EXISTS edges_drug ON edges (drug_id);
+CREATE TABLE IF NOT EXISTS occ (src INTEGER, pos INTEGER, h INTEGER, PRIMARY KEY (src, pos));
+CREATE INDEX IF NOT EXISTS occ_h ON occ (h);
+CREATE TABLE IF NOT EXISTS fragments (atc TEXT PRIMARY KEY, payload TEXT);
+"""
+
+def _meta(cfg) -> Dict[str, str]:
+    """Paramètres dont dépend l'état : s'ils changent, l'état est reconstruit de zéro."""
+    return {
+        "version": STATE_VERSION,
+        "pandas": pd.__version__,                 # stabilité de hash_pandas_object
+        "dayfirst": str(cfg.parse_dayfirst),
+        "auto_id": str(cfg.generate_auto_id_if_empty),
+        "dedup": str(cfg.dedup_publications),
+    }
+
+def open_state(fp: Path, cfg) -> sqlite3.Connection:
+    """Ouvre (ou réinitialise) le store SQLite de l'exécution incrémentale."""
+    conn = sqlite3.connect(fp)
+    conn.executescript(_SCHEMA)
+    meta = _meta(cfg)
+    if dict(conn.execute("SELECT key, value FROM meta")) != meta:
+        conn.executescript("""
+            DELETE FROM meta; DELETE FROM drugs; DELETE FROM pubs;
+            DELETE FROM edges; DELETE FROM occ; DELETE FROM fragments;""")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+        conn.commit()
+    return conn
+
+def _execute_all(conn: sqlite3.Connection, script: str) -> None:
+    """Exécute plusieurs instructions dans la transaction courante (contrairement à executescript)."""
+    for stmt in script.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+
+def row_hashes(df: pd.DataFrame, source: str) -> pd.Series:
+    """Empreinte de contenu (int64) par ligne : source + id/title/journal/date_iso."""
+    cols = df.reindex(columns=["id", "title", "journal", "date_iso"]).assign(source=source)
+    h = pd.util.hash_pandas_object(cols, index=False).to_numpy(dtype="uint64").view("int64")
+    return pd.Series(h, index=df.index)
+
+def _to_sql_rows(df: pd.DataFrame, cols: list) -> list:
+    """Lignes Python pour sqlite (NaN/NaT -> None)."""
+    sub = df[cols].astype(object)
+    return list(sub.where(sub.notna(), None).itertuples(index=False, name=None))
+
+def _sync_drugs(conn: sqlite3.Connection, drugs: pd.DataFrame, rev: int) -> Tuple[pd.DataFrame, set]:
+    """Met à jour la table drugs ; renvoie (médicaments ajoutés, ATC impactés)."""
+    cur = (drugs.assign(pos=range(len(drugs)))
+                .groupby(["atccode", "drug"], sort=False)
+                .agg(n=("pos", "size"), pos=("pos", "min"))
+                .reset_index())
+    old = pd.DataFrame(conn.execute("SELECT drug_id, atccode, drug, n FROM drugs").fetchall(),
+                       columns=["drug_id", "atccode", "drug", "n_old"])
+    m = cur.merge(old, on=["atccode", "drug"], how="outer", indicator=True)
+    added = m[m["_merge"] == "left_only"]
+    removed = m[m["_merge"] == "right_only"]
+    changed = m[(m["_merge"] == "both") & (m["n"] != m["n_old"])]
+    affected = set(added["atccode"]) | set(removed["atccode"]) | set(changed["atccode"])
+
+    for drug_id in removed["drug_id"].astype(int):
+        conn.execute("DELETE FROM edges WHERE drug_id = ?", (drug_id,))
+        conn.execute("DELETE FROM drugs WHERE drug_id = ?", (drug_id,))
+    conn.executemany("UPDATE drugs SET n = ?, pos = ? WHERE atccode = ? AND drug = ?",
+                     _to_sql_rows(m[m["_merge"] == "both"], ["n", "pos", "atccode", "drug"]))
+    conn.executemany("INSERT INTO drugs (atccode, drug, n, pos, rev) VALUES (?, ?, ?, ?, ?)",
+                     _to_sql_rows(added.assign(rev=rev), ["atccode", "drug", "n", "pos", "rev"]))
+    added = pd.DataFrame(conn.execute("SELECT drug_id, atccode, drug FROM drugs WHERE rev = ?", (rev,)).fetchall(),
+                         columns=["drug_id", "atccode", "drug"])
+    return added, affected
+
+def _match_and_store(conn: sqlite3.Connection, rows: pd.DataFrame, source: str, matcher,
+                     drug_ids: Dict[tuple, int]) -> None:
+    """Matche `rows` (colonne _h = empreinte) et enregistre un edge par (empreinte, médicament)."""
+    edges = find_mentions(rows, source, matcher, keep_row=True)
+    if edges.empty:
+        return
+    e = edges.assign(h=rows["_h"].to_numpy()[edges["row"].to_numpy(dtype=int)],
+                     drug_id=[drug_ids[k] for k in zip(edges["drug_atccode"], edges["drug_name"])])
+    conn.executemany("INSERT INTO edges VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     _to_sql_rows(e, ["h", "drug_id", "source", "pub_id", "title", "journal", "date"]))
+
+def run_incremental(conn: sqlite3.Connection, cfg, drugs: pd.DataFrame,
+                    frames: Iterable[Tuple[pd.DataFrame, str]]) -> None:
+    """Met à jour l'état ; le JSON final (identique à un run complet) se relit via iter_fragments.
+    - publications : empreinte de contenu ; seules les nouvelles empreintes sont matchées
+    - médicaments ajoutés : matchés contre les publications déjà connues uniquement
+    - agrégats : seuls les ATC dont les edges (ou leur ordre) changent sont recalculés
+    `frames` : (DataFrame avec date_iso, source) dans l'ordre d'un run complet.
+    """
+    rev = (conn.execute("SELECT MAX(r) FROM (SELECT MAX(rev) AS r FROM drugs UNION ALL "
+                        "SELECT MAX(rev) FROM pubs)").fetchone()[0] or 0) + 1
+    added, affected = _sync_drugs(conn, drugs, rev)
+    ids = {(a, d): i for i, a, d in conn.execute("SELECT drug_id, atccode, drug FROM drugs")}
+    dictionary = pd.DataFrame(list(ids), columns=["atccode", "drug"])
+    cache_fp = matcher_cache_fp(dictionary, cfg.cache_dir) if cfg.matcher_cache else None
+    full_matcher, _ = load_or_build_matcher(dictionary, cache_fp)
+    added_matcher = build_matcher(build_patterns(added)) if not added.empty else None
+
+    _execute_all(conn, """
+        DROP TABLE IF EXISTS cur;
+        CREATE TABLE cur (src INTEGER, pos INTEGER, h INTEGER, PRIMARY KEY (src, pos));
+        CREATE TEMP TABLE IF NOT EXISTS chunk_h (h INTEGER PRIMARY KEY)""")
+    n_new = 0
+    offsets: Dict[str, int] = {}
+    for df, source in frames:
+        start = offsets.get(source, 0)
+        offsets[source] = start + len(df)
+        hs = row_hashes(df, source)
+        conn.executemany("INSERT INTO cur VALUES (?, ?, ?)",
+                         zip([SOURCE_RANK[source]] * len(df), range(start, start + len(df)), hs.tolist()))
+
+        uniq = df.assign(_h=hs.to_numpy()).drop_duplicates("_h")
+        conn.execute("DELETE FROM chunk_h")
+        conn.executemany("INSERT INTO chunk_h VALUES (?)", ((h,) for h in uniq["_h"].tolist()))
+        known = dict(conn.execute("SELECT c.h, p.rev FROM chunk_h c JOIN pubs p USING (h)"))
+        revs = uniq["_h"].map(known)
+
+        new = uniq[revs.isna().to_numpy()]
+        if not new.empty:
+            n_new += len(new)
+            _match_and_store(conn, new, source, full_matcher, ids)
+            conn.executemany("INSERT INTO pubs VALUES (?, ?)", ((h, rev) for h in new["_h"].tolist()))
+        stale = uniq[(revs < rev).to_numpy()]
+        if added_matcher is not None and not stale.empty:
+            _match_and_store(conn, stale, source, added_matcher, ids)
+            conn.executemany("UPDATE pubs SET rev = ? WHERE h = ?", ((rev, h) for h in stale["_h"].tolist()))
+
+    # Publications ajoutées, supprimées ou déplacées -> ATC dont le contenu ou l'ordre change
+    _execute_all(conn, """
+        CREATE INDEX cur_h ON cur (h);
+        DROP TABLE IF EXISTS temp.moved;
+        CREATE TEMP TABLE moved AS
+            SELECT c.h FROM cur c LEFT JOIN occ o ON o.src = c.src AND o.pos = c.pos
+             WHERE o.h IS NULL OR o.h != c.h
+            UNION
+            SELECT o.h FROM occ o LEFT JOIN cur c ON c.src = o.src AND c.pos = o.pos
+             WHERE c.h IS NULL OR c.h != o.h""")
+    affected |= {a for (a,) in conn.execute(
+        "SELECT DISTINCT d.atccode FROM moved m JOIN edges e ON e.h = m.h JOIN drugs d ON d.drug_id = e.drug_id")}
+    affected |= set(added["atccode"])
+
+    _execute_all(conn, """
+        DELETE FROM edges WHERE h NOT IN (SELECT h FROM cur);
+        DELETE FROM pubs WHERE h NOT IN (SELECT h FROM cur);
+        DROP TABLE occ;
+        ALTER TABLE cur RENAME TO occ;
+        DROP INDEX cur_h;
+        CREATE INDEX occ_h ON occ (h)""")
+
+    _rebuild_fragments(conn, cfg, affected)
+    conn.commit()
+    print(f"[ok] incrémental : {n_new} publications nouvelles/modifiées, "
+          f"{len(added)} médicaments ajoutés, {len(affected)} ATC recalculés")
+
+def iter_fragments(conn: sqlite3.Connection) -> Iterator[Tuple[str, Any]]:
+    """Entrées (code ATC, objet) du JSON final, dans l'ordre, lues une à une depuis l'état."""
+    for atc, payload in conn.execute("SELECT atc, payload FROM fragments ORDER BY atc"):
+        yield atc, json.loads(payload)
+
+def _rebuild_fragments(conn: sqlite3.Connection, cfg, atcs: set) -> None:
+    """Recalcule les entrées JSON des ATC impactés à partir des edges stockés,
+    dans l'ordre d'un run complet (source, position, médicament)."""
+    atcs = sorted(a for a in atcs if a is not None)
+    if not atcs:
+        return
+    conn.execute("DELETE FROM fragments WHERE atc IN (SELECT value FROM json_each(?))", (json.dumps(atcs),))
+    rows = conn.execute("""
+        SELECT d.atccode, d.drug, e.source, e.pub_id, e.title, e.journal, e.date, d.n
+          FROM drugs d
+          JOIN edges e ON e.drug_id = d.drug_id
+          JOIN occ o ON o.h = e.h
+         WHERE d.atccode IN (SELECT value FROM json_each(?))
+         ORDER BY o.src, o.pos, d.pos""", (json.dumps(atcs),)).fetchall()
+    edges = pd.DataFrame.from_records(rows, columns=EDGE_COLUMNS + ["n"])
+    edges = edges.loc[edges.index.repeat(edges["n"])].drop(columns="n").reset_index(drop=True)
+    entries = iter_by_atc(edges, generate_auto_id_if_empty=cfg.generate_auto_id_if_empty)
+    conn.executemany("INSERT INTO fragments VALUES (?, ?)",
+                     ((atc, json.dumps(obj, ensure_ascii=False, allow_nan=False)) for atc, obj in entries))
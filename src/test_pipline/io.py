@@ -1,7 +1,17 @@
 from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-import json, re
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Tuple
+import hashlib, json, os, re
 import pandas as pd
+from .partition import MANIFEST_NAME, MANIFEST_VERSION, shard_key
+
+PUB_COLUMNS = ["id", "title", "journal", "date"]
+_TRAILING_COMMA = re.compile(r",\s*([\]}])")
+_MAX_PENDING = 1 << 24   # au-delà, un objet JSON illisible est ignoré (reprise à l'objet suivant)
+OUTPUT_FORMATS = ("pretty", "compact", "ndjson")
 
 def load_lenient_json_list(path: Path) -> list[dict]:
     """Charge un JSON possiblement mal formé et renvoie une liste de dicts.
@@ -11,7 +21,7 @@ def load_lenient_json_list(path: Path) -> list[dict]:
     if not path.exists():
         return []
     raw = path.read_text(encoding="utf-8").strip().lstrip("\ufeff")
-    raw = re.sub(r",\s*([\]}])", r"\1", raw)  
+    raw = _TRAILING_COMMA.sub(r"\1", raw)
     if not raw.startswith("["):
         raw = "[" + raw + "]"                
     try:
@@ -28,32 +38,405 @@ def load_lenient_json_list(path: Path) -> list[dict]:
                 pass
         return items
 
+def _append_block(pending: str, more: str) -> str:
+    """pending + more, virgules finales retirées. Seule une virgule finale de pending (suivie de
+    blancs) peut former un motif avec le nouveau bloc : le reste n'est pas repassé à la regex."""
+    head = pending.rstrip()
+    cut = len(head) - 1 if head.endswith(",") else len(pending)
+    return pending[:cut] + _TRAILING_COMMA.sub(r"\1", pending[cut:] + more)
+
+def _truncated(err: json.JSONDecodeError, buf: str) -> bool:
+    """L'échec de décodage peut-il venir de la fin du buffer (objet incomplet) ?
+    Une chaîne ne contient jamais de saut de ligne brut : « Unterminated string » = fin du buffer."""
+    return err.msg.startswith("Unterminated string") or err.pos >= len(buf.rstrip()) - 8
+
+def _resync(buf: str, pos: int) -> int | None:
+    """Reprise après un objet illisible commençant en buf[pos] : le premier de (a) la fin de l'objet,
+    si ses accolades se referment (hors chaînes), et (b) le début d'une ligne qui ouvre un objet sans
+    être plus indentée que lui (jamais l'intérieur de l'objet) ; None si le buffer ne suffit pas."""
+    line = buf.rfind("\n", 0, pos) + 1
+    indent = len(buf[line:pos]) - len(buf[line:pos].lstrip(" \t"))
+    is_obj = buf[pos] == "{"
+    depth, in_str, esc = 0, False, False
+    for i in range(pos, len(buf)):
+        c = buf[i]
+        if c == "\n":
+            # Une chaîne JSON ne contient pas de saut de ligne brut
+            in_str = esc = False
+            k = i + 1
+            while k < len(buf) and buf[k] in " \t":
+                k += 1
+            if k < len(buf) and buf[k] == "{" and k - i - 1 <= indent:
+                return k
+        elif in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if is_obj and depth == 0:
+                return i + 1
+    return None
+
+def iter_lenient_json(path: Path, block_size: int = 1 << 16) -> Iterator[dict]:
+    """Version streaming de load_lenient_json_list : lit le fichier par blocs et renvoie
+    les objets un par un (liste JSON, objets concaténés ou NDJSON).
+    - Même tolérance : BOM, virgules finales, un seul objet non listé.
+    - Un objet illisible est sauté en entier (reprise à sa fin ou au prochain objet de même
+      niveau) ; seuls les dicts sont renvoyés.
+    - Un objet incomplet relance une lecture de taille doublée à chaque essai (pas de
+      redécodage quadratique des gros objets).
+    """
+    if not path.exists():
+        return
+    dec = json.JSONDecoder()
+    buf, pos, eof, want = "", 0, False, block_size
+    with path.open(encoding="utf-8-sig") as f:
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] in "[],"):
+                pos += 1
+            err = None
+            if pos < len(buf):
+                try:
+                    obj, end = dec.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    err = e
+                else:
+                    if isinstance(obj, dict):
+                        yield obj
+                    pos, want = end, block_size
+                    continue
+            incomplete = err is None or _truncated(err, buf)
+            nxt = None if incomplete else _resync(buf, pos)
+            if nxt is None and not eof and len(buf) - pos < _MAX_PENDING:
+                # Objet incomplet, ou fin de l'objet illisible pas encore lue
+                more = f.read(want)
+                eof, want = not more, want * 2
+                line = buf.rfind("\n", 0, pos) + 1
+                start = line if pos - line <= 256 else pos   # indentation gardée pour _resync
+                buf, pos = _append_block(buf[start:], more), pos - start
+                continue
+            if err is None:
+                return
+            if incomplete:
+                nxt = _resync(buf, pos)
+            pos, want = (len(buf) if nxt is None else nxt), block_size
+
+def _require_pyarrow():
+    """Import de pyarrow (dépendance optionnelle, nécessaire pour le Parquet)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow est requis pour les fichiers Parquet (pip install pyarrow)") from e
+    return pa, pq
+
+def _read_table(fp: Path) -> pd.DataFrame:
+    """Lit un fichier tabulaire : Parquet (memory-map) ou CSV selon l'extension."""
+    if fp.suffix == ".parquet":
+        _require_pyarrow()
+        return pd.read_parquet(fp, memory_map=True)
+    return pd.read_csv(fp)
+
+def _iter_table(fp: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lecture par blocs d'un CSV (id lu en texte) ou d'un Parquet (par batchs)."""
+    if fp.suffix == ".parquet":
+        _, pq = _require_pyarrow()
+        for batch in pq.ParquetFile(fp, memory_map=True).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(fp, chunksize=chunk_size, dtype={"id": str}) as reader:
+            yield from reader
+
+def _pub_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Garantit les colonnes id/title/journal/date (dans cet ordre)."""
+    return df.reindex(columns=PUB_COLUMNS)
+
 def read_drugs(fp: Path) -> pd.DataFrame:
-    """Lit drugs.csv et normalise les champs de base."""
-    df = pd.read_csv(fp)
+    """Lit drugs.csv (ou drugs.parquet) et normalise les champs de base."""
+    df = _read_table(fp)
     return (df.assign(
                 drug=lambda d: d["drug"].astype(str).str.strip(),
                 atccode=lambda d: d["atccode"].astype(str).str.strip()
             )[["atccode","drug"]]
     )
 
-def read_pubmed(csv_fp: Path, json_fp: Path) -> pd.DataFrame:
-    """Lit pubmed.csv et/ou pubmed.json et harmonise le schéma."""
-    parts = []
-    if csv_fp.exists():
-        parts.append(pd.read_csv(csv_fp))
-    if json_fp.exists():
-        lst = load_lenient_json_list(json_fp)
-        if lst:
-            parts.append(pd.DataFrame(lst))
+def pubmed_files(csv_fp: Path, json_fp: Path, parquet_fp: Path | None = None) -> list[Path]:
+    """Fichiers pubmed présents, dans l'ordre de concaténation (csv, json, parquet)."""
+    return [fp for fp in (csv_fp, json_fp, parquet_fp) if fp is not None and fp.exists()]
+
+def read_pubmed_file(fp: Path) -> pd.DataFrame | None:
+    """Lit un fichier pubmed (.csv, .json "lenient" ou .parquet) ; None si la liste JSON est vide."""
+    if fp.suffix == ".json":
+        lst = load_lenient_json_list(fp)
+        return pd.DataFrame(lst) if lst else None
+    if fp.suffix == ".parquet":
+        return _read_table(fp)
+    return pd.read_csv(fp)
+
+def concat_pubmed(parts: Iterable[pd.DataFrame | None]) -> pd.DataFrame:
+    """Concatène les fichiers pubmed lus et harmonise le schéma."""
+    parts = [p for p in parts if p is not None]
     if parts:
         df = pd.concat(parts, ignore_index=True)
     else:
-        df = pd.DataFrame(columns=["id","title","journal","date"])
-    df = df.rename(columns={"id":"id","title":"title","journal":"journal","date":"date"})
-    return df[["id","title","journal","date"]]
+        df = pd.DataFrame(columns=PUB_COLUMNS)
+    return df[PUB_COLUMNS]
+
+def read_pubmed(csv_fp: Path, json_fp: Path, parquet_fp: Path | None = None) -> pd.DataFrame:
+    """Lit pubmed.csv, pubmed.json et/ou pubmed.parquet et harmonise le schéma."""
+    return concat_pubmed(read_pubmed_file(fp) for fp in pubmed_files(csv_fp, json_fp, parquet_fp))
 
 def read_clinical_trials(fp: Path) -> pd.DataFrame:
-    """Lit clinical_trials.csv et renomme scientific_title -> title."""
-    df = pd.read_csv(fp).rename(columns={"scientific_title":"title"})
+    """Lit clinical_trials.csv (ou .parquet) et renomme scientific_title -> title."""
+    df = _read_table(fp).rename(columns={"scientific_title":"title"})
     return df[["id","title","journal","date"]]
+
+def iter_pubmed(csv_fp: Path, json_fp: Path, chunk_size: int,
+                parquet_fp: Path | None = None) -> Iterator[pd.DataFrame]:
+    """Lecture streaming de pubmed.csv, pubmed.json puis pubmed.parquet : blocs d'au plus
+    `chunk_size` lignes. L'id CSV est lu en texte pour rester homogène d'un bloc à l'autre.
+    """
+    if csv_fp.exists():
+        for chunk in _iter_table(csv_fp, chunk_size):
+            yield _pub_schema(chunk)
+    items = iter_lenient_json(json_fp)
+    while True:
+        batch = list(islice(items, chunk_size))
+        if not batch:
+            break
+        yield _pub_schema(pd.DataFrame(batch))
+    if parquet_fp is not None and parquet_fp.exists():
+        for chunk in _iter_table(parquet_fp, chunk_size):
+            yield _pub_schema(chunk)
+
+def iter_clinical_trials(fp: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Lecture streaming de clinical_trials.csv (ou .parquet) par blocs de `chunk_size` lignes."""
+    for chunk in _iter_table(fp, chunk_size):
+        yield _pub_schema(chunk.rename(columns={"scientific_title": "title"}))
+
+class AtcJsonWriter:
+    """Sérialisation incrémentale d'entrées (code ATC, objet) dans l'un des OUTPUT_FORMATS,
+    vers `write` (callable recevant du texte)."""
+
+    def __init__(self, write: Callable[[str], Any], fmt: str = "pretty"):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Format de sortie inconnu: {fmt!r} (attendu: {OUTPUT_FORMATS})")
+        self._write, self.fmt, self.n = write, fmt, 0
+        self._enc = json.JSONEncoder(ensure_ascii=False, allow_nan=False,
+                                     indent=2 if fmt == "pretty" else None,
+                                     separators=(",", ":") if fmt == "compact" else None)
+
+    def add(self, key: str, obj: Any) -> None:
+        enc = self._enc
+        if self.fmt == "ndjson":
+            self._write(enc.encode(obj) + "\n")
+        elif self.fmt == "compact":
+            self._write(("{" if self.n == 0 else ",") + enc.encode(str(key)) + ":" + enc.encode(obj))
+        else:
+            body = enc.encode(obj).replace("\n", "\n  ")
+            self._write(("{\n  " if self.n == 0 else ",\n  ") + enc.encode(str(key)) + ": " + body)
+        self.n += 1
+
+    def close(self) -> None:
+        if self.fmt != "ndjson":
+            self._write("{}" if self.n == 0 else ("}" if self.fmt == "compact" else "\n}"))
+
+def write_by_atc(entries: Iterable[Tuple[str, Any]], fp: Path, fmt: str = "pretty") -> int:
+    """Écrit le JSON par ATC entrée par entrée (sans construire le dict complet), de façon atomique
+    (fichier temporaire puis rename). Renvoie le nombre d'entrées écrites.
+    - pretty  : identique à json.dump(..., indent=2)
+    - compact : un seul objet JSON sans indentation
+    - ndjson  : une entrée ATC par ligne
+    Les NaN sont refusés (allow_nan=False) : les entrées doivent déjà contenir None.
+    """
+    tmp = fp.with_name(fp.name + ".tmp")
+    try:
+        with tmp.open("w", encoding="utf-8") as f:
+            w = AtcJsonWriter(f.write, fmt)
+            for key, obj in entries:
+                w.add(key, obj)
+            w.close()
+        os.replace(tmp, fp)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return w.n
+
+class _ShardFile:
+    """Une partition en cours d'écriture : fichier temporaire, sha256 et taille tenus au fil de l'eau."""
+
+    def __init__(self, fp: Path, fmt: str):
+        self.fp, self.tmp = fp, fp.with_name(fp.name + ".tmp")
+        self._f = self.tmp.open("wb")
+        self._sha, self.bytes = hashlib.sha256(), 0
+        self._writer = AtcJsonWriter(self._write, fmt)
+
+    def _write(self, s: str) -> None:
+        b = s.encode("utf-8")
+        self._sha.update(b)
+        self._f.write(b)
+        self.bytes += len(b)
+
+    def write_batch(self, items: list, prev: Future | None) -> None:
+        # Les lots d'une même partition sont chaînés : écrits dans l'ordre de soumission
+        if prev is not None:
+            prev.result()
+        for key, obj in items:
+            self._writer.add(key, obj)
+
+    def close(self) -> dict:
+        self._writer.close()
+        self._f.close()
+        os.replace(self.tmp, self.fp)
+        return {"file": self.fp.name, "n_atc": self._writer.n, "bytes": self.bytes, "sha256": self._sha.hexdigest()}
+
+    def discard(self) -> None:
+        self._f.close()
+        self.tmp.unlink(missing_ok=True)
+
+def tee_partitioned(entries: Iterable[Tuple[str, Any]], out_dir: Path, fmt: str = "pretty", workers: int = 4,
+                    batch_size: int = 256) -> Iterator[Tuple[str, Any]]:
+    """Laisse passer les entrées ATC tout en les répartissant par groupe anatomique (partition.shard_key :
+    1re lettre du code) dans out_dir/<lettre>.json (ou .ndjson), au format `fmt`. Les lots de `batch_size`
+    entrées sont encodés et écrits par un pool de `workers` threads (au plus 2 lots en attente par thread) ;
+    en fin de flux, chaque fichier est renommé puis le manifeste (nb d'entrées, taille, sha256) est écrit
+    en dernier, atomiquement. Les partitions d'un run précédent absentes du nouveau sont supprimées."""
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Format de sortie inconnu: {fmt!r} (attendu: {OUTPUT_FORMATS})")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ext = "ndjson" if fmt == "ndjson" else "json"
+    workers = max(1, workers)
+    shards: dict[str, _ShardFile] = {}
+    batches: dict[str, list] = {}
+    last: dict[str, Future] = {}
+    pending: deque[Future] = deque()
+    pool = ThreadPoolExecutor(workers)
+
+    def submit(name: str) -> None:
+        last[name] = fut = pool.submit(shards[name].write_batch, batches.pop(name), last.get(name))
+        pending.append(fut)
+        while len(pending) > 2 * workers:
+            pending.popleft().result()
+
+    ok = False
+    try:
+        for key, obj in entries:
+            name = shard_key(key)
+            if name not in shards:
+                shards[name] = _ShardFile(out_dir / f"{name}.{ext}", fmt)
+            batch = batches.setdefault(name, [])
+            batch.append((key, obj))
+            if len(batch) >= batch_size:
+                submit(name)
+            yield key, obj
+        for name in list(batches):
+            submit(name)
+        while pending:
+            pending.popleft().result()
+        files = {name: shards[name].close() for name in sorted(shards)}
+        manifest = {"version": MANIFEST_VERSION, "format": fmt, "partition": "atc_level1",
+                    "n_atc": sum(f["n_atc"] for f in files.values()), "shards": files}
+        fp = out_dir / MANIFEST_NAME
+        stale = set()
+        if fp.exists():
+            try:
+                stale = {f["file"] for f in json.loads(fp.read_text(encoding="utf-8"))["shards"].values()}
+            except (ValueError, KeyError, TypeError):
+                pass
+        tmp = fp.with_name(fp.name + ".tmp")
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, fp)
+        for name in stale - {f["file"] for f in files.values()}:
+            (out_dir / name).unlink(missing_ok=True)
+        ok = True
+    finally:
+        pool.shutdown(wait=True, cancel_futures=not ok)
+        if not ok:
+            for shard in shards.values():
+                shard.discard()
+
+def write_journal_index(rows: list[tuple[str, int]], fp: Path) -> None:
+    """Index compact journal -> nb de médicaments distincts ([[journal, n], ...]), écrit atomiquement."""
+    tmp = fp.with_name(fp.name + ".tmp")
+    tmp.write_text(json.dumps([list(r) for r in rows], ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, fp)
+
+def tee_columnar(entries: Iterable[Tuple[str, Any]], edges_fp: Path, journals_fp: Path,
+                 batch_rows: int = 65536) -> Iterator[Tuple[str, Any]]:
+    """Laisse passer les entrées ATC tout en écrivant deux tables Parquet (par batchs, atomique) :
+    - edges_fp    : atccode, drug, source, id, title, date, journal (une ligne par publication citée)
+    - journals_fp : atccode, drug, journal, first_date, last_date, n_pubs
+    `atccode` est la clé ATC du JSON ; les ids sont stockés en texte, les dates en date32.
+    """
+    pa, pq = _require_pyarrow()
+    str_cols = {"edges": ["atccode", "drug", "source", "id", "title", "journal"],
+                "journals": ["atccode", "drug", "journal"]}
+    date_cols = {"edges": ["date"], "journals": ["first_date", "last_date"]}
+    schemas = {
+        "edges": pa.schema([("atccode", pa.string()), ("drug", pa.string()), ("source", pa.string()),
+                            ("id", pa.string()), ("title", pa.string()), ("date", pa.date32()),
+                            ("journal", pa.string())]),
+        "journals": pa.schema([("atccode", pa.string()), ("drug", pa.string()), ("journal", pa.string()),
+                               ("first_date", pa.date32()), ("last_date", pa.date32()), ("n_pubs", pa.int64())]),
+    }
+    paths = {"edges": edges_fp, "journals": journals_fp}
+    tmps = {k: fp.with_name(fp.name + ".tmp") for k, fp in paths.items()}
+    bufs = {k: {f.name: [] for f in schema} for k, schema in schemas.items()}
+    writers = {k: pq.ParquetWriter(tmps[k], schemas[k]) for k in schemas}
+
+    def flush(k: str) -> None:
+        buf = bufs[k]
+        arrays = {c: pa.array(buf[c], pa.string()) for c in str_cols[k]}
+        arrays.update({c: pa.array(buf[c], pa.string()).cast(pa.date32()) for c in date_cols[k]})
+        if k == "journals":
+            arrays["n_pubs"] = pa.array(buf["n_pubs"], pa.int64())
+        writers[k].write_table(pa.table([arrays[f.name] for f in schemas[k]], schema=schemas[k]))
+        for v in buf.values():
+            v.clear()
+
+    ok = False
+    try:
+        for key, obj in entries:
+            e, j = bufs["edges"], bufs["journals"]
+            for field, source in (("pubmed", "pubmed"), ("clinical_trials", "clinical_trial")):
+                for item in obj.get(field) or []:
+                    e["atccode"].append(str(key)); e["drug"].append(obj.get("drug")); e["source"].append(source)
+                    e["id"].append(None if item.get("id") is None else str(item["id"]))
+                    e["title"].append(item.get("title")); e["date"].append(item.get("date"))
+                    e["journal"].append(item.get("journal"))
+            for item in obj.get("journals") or []:
+                j["atccode"].append(str(key)); j["drug"].append(obj.get("drug"))
+                j["journal"].append(item.get("journal"))
+                j["first_date"].append(item.get("first_date")); j["last_date"].append(item.get("last_date"))
+                j["n_pubs"].append(item.get("n_pubs"))
+            for k in bufs:
+                if len(bufs[k]["atccode"]) >= batch_rows:
+                    flush(k)
+            yield key, obj
+        for k in bufs:
+            flush(k)
+        ok = True
+    finally:
+        for k, w in writers.items():
+            w.close()
+            if ok:
+                os.replace(tmps[k], paths[k])
+            else:
+                tmps[k].unlink(missing_ok=True)
+
+def journal_drug_counts(journals_fp: Path) -> list[tuple[str, int]]:
+    """Journal -> nb de codes ATC distincts, depuis la table Parquet des journaux
+    (seules les colonnes atccode/journal sont lues, en memory-map). Trié par (-count, journal)."""
+    _require_pyarrow()
+    df = pd.read_parquet(journals_fp, columns=["atccode", "journal"], memory_map=True)
+    df = df[df["journal"].notna() & (df["journal"] != "")]
+    counts = df.groupby("journal")["atccode"].nunique()
+    return sorted(((str(j), int(c)) for j, c in counts.items()), key=lambda x: (-x[1], x[0]))
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+import pandas as pd
+from .config import Config
+from .io import (read_drugs, read_pubmed, read_clinical_trials, iter_pubmed, iter_clinical_trials,
+                 pubmed_files, read_pubmed_file, concat_pubmed)
+from .clean import add_iso_date
+from .match import matcher_cache_fp, load_or_build_matcher
+from .metrics import RunMetrics
+
+SOURCES = ("pubmed", "clinical_trial")
+_DONE = object()
+
+def _run_now(fn: Callable, *args) -> Future:
+    """Équivalent séquentiel de pool.submit : exécute tout de suite, renvoie un Future résolu."""
+    fut: Future = Future()
+    try:
+        fut.set_result(fn(*args))
+    except BaseException as e:
+        fut.set_exception(e)
+    return fut
+
+def prefetch(items: Iterable, depth: int) -> Iterator:
+    """Consomme `items` dans un thread dédié, au plus `depth` éléments d'avance (mémoire bornée).
+    Le thread démarre immédiatement ; les exceptions sont relancées côté consommateur."""
+    q: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(x) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(x, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for x in items:
+                if not put((x, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    def consume() -> Iterator:
+        try:
+            while True:
+                x, err = q.get()
+                if x is _DONE:
+                    if err is not None:
+                        raise err
+                    return
+                yield x
+        finally:
+            stop.set()
+    return consume()
+
+def _drugs_and_matcher(cfg: Config, metrics: RunMetrics, with_matcher: bool):
+    """drugs.csv, puis matcher (cache ou construction) pendant que les publications se chargent."""
+    with metrics.timed("read") as st:
+        drugs = read_drugs(cfg.drugs_fp)
+        st["rows"] += len(drugs)
+    metrics.count("drugs", len(drugs))
+    if not with_matcher:
+        return drugs, None, None
+    with metrics.timed("matcher"):
+        cache_fp = matcher_cache_fp(drugs, cfg.cache_dir) if cfg.matcher_cache else None
+        matcher, hit = load_or_build_matcher(drugs, cache_fp)
+    metrics.count("matcher_cache_hit", hit)
+    return drugs, matcher, cache_fp
+
+def _with_dates(df: pd.DataFrame, source: str, cfg: Config, metrics: RunMetrics) -> pd.DataFrame:
+    metrics.count(source, len(df))
+    with metrics.timed("dates") as st:
+        df = add_iso_date(df, dayfirst=cfg.parse_dayfirst)
+        st["rows"] += len(df)
+    return df
+
+def _read_file(fp: Path, metrics: RunMetrics) -> pd.DataFrame | None:
+    with metrics.timed("read") as st:
+        df = read_pubmed_file(fp)
+        st["rows"] += 0 if df is None else len(df)
+    return df
+
+def _read_source(source: str, cfg: Config, metrics: RunMetrics) -> pd.DataFrame:
+    """Lecture complète d'une source avec dates ISO."""
+    with metrics.timed("read") as st:
+        if source == "pubmed":
+            df = read_pubmed(cfg.pubmed_csv_fp, cfg.pubmed_json_fp, cfg.pubmed_parquet_fp)
+        else:
+            df = read_clinical_trials(cfg.ctrials_fp)
+        st["rows"] += len(df)
+    return _with_dates(df, source, cfg, metrics)
+
+def _iter_source(source: str, cfg: Config, metrics: RunMetrics) -> Iterator[pd.DataFrame]:
+    """Lecture par blocs de cfg.chunk_size lignes d'une source, avec dates ISO."""
+    if source == "pubmed":
+        chunks = iter_pubmed(cfg.pubmed_csv_fp, cfg.pubmed_json_fp, cfg.chunk_size, cfg.pubmed_parquet_fp)
+    else:
+        chunks = iter_clinical_trials(cfg.ctrials_fp, cfg.chunk_size)
+    while True:
+        with metrics.timed("read") as st:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                st["rows"] += len(chunk)
+        if chunk is None:
+            return
+        yield _with_dates(chunk, source, cfg, metrics)
+
+def wait_loaded(fut: Future, metrics: RunMetrics):
+    """Résultat d'un chargement lancé par load_inputs, attente mesurée (étape io_wait)."""
+    with metrics.stage("io_wait"):
+        return fut.result()
+
+def _gather(pubmed: list[Future], ctrials: Future, cfg: Config, metrics: RunMetrics
+            ) -> Iterator[tuple[pd.DataFrame, str]]:
+    """pubmed dès que ses fichiers sont lus (dates parsées ici, pendant que les essais se
+    chargent encore), puis les essais."""
+    df = concat_pubmed([wait_loaded(f, metrics) for f in pubmed])
+    yield _with_dates(df, "pubmed", cfg, metrics), "pubmed"
+    yield wait_loaded(ctrials, metrics), "clinical_trial"
+
+def load_inputs(cfg: Config, metrics: RunMetrics, pool: ThreadPoolExecutor | None,
+                with_matcher: bool = True) -> tuple[Future, Iterator[tuple[pd.DataFrame, str]]]:
+    """Étape de chargement : renvoie (Future de (drugs, matcher, cache_fp), itérateur de
+    (DataFrame avec date_iso, source)), frames dans l'ordre pubmed puis essais.
+    Sans pool : lecture séquentielle, à la demande. Avec un pool de threads : drugs.csv, chaque
+    fichier pubmed et les essais sont lus et parsés en même temps, le matcher est compilé (ou
+    relu du cache) pendant ce temps, et pubmed est disponible sans attendre les essais.
+    En lecture par blocs, chaque source a son thread lecteur avec 2 blocs d'avance au plus.
+    """
+    if pool is None:
+        drugs = _run_now(_drugs_and_matcher, cfg, metrics, with_matcher)
+        if cfg.chunk_size:
+            frames = ((df, s) for s in SOURCES for df in _iter_source(s, cfg, metrics))
+        else:
+            frames = ((_read_source(s, cfg, metrics), s) for s in SOURCES)
+        return drugs, frames
+
+    drugs = pool.submit(_drugs_and_matcher, cfg, metrics, with_matcher)
+    if cfg.chunk_size:
+        streams = [(prefetch(_iter_source(s, cfg, metrics), depth=2), s) for s in SOURCES]
+        return drugs, ((df, s) for stream, s in streams for df in stream)
+    files = pubmed_files(cfg.pubmed_csv_fp, cfg.pubmed_json_fp, cfg.pubmed_parquet_fp)
+    pubmed = [pool.submit(_read_file, fp, metrics) for fp in files]
+    ctrials = pool.submit(_read_source, "clinical_trial", cfg, metrics)
+    return drugs, _gather(pubmed, ctrials, cfg, metrics)
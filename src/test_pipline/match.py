@@ -1,35 +1,313 @@
 from __future__ import annotations
-import re
+import hashlib, multiprocessing, os, pickle, re, sys
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from typing import Iterable, Iterator
+import numpy as np
 import pandas as pd
+from .clean import normalize_text
 
-def build_drug_pattern(name: str) -> re.Pattern:
-    """Regex 'mot entier' insensible à la casse pour un nom de médicament."""
-    esc = re.escape(str(name))
-    return re.compile(rf"\b{esc}\b", flags=re.IGNORECASE)
+EDGE_COLUMNS = ["drug_atccode", "drug_name", "source", "pub_id", "title", "journal", "date"]
+MATCHER_VERSION = 3          # à incrémenter si la structure du matcher change (invalide le cache)
+_MATCHER_CACHE_KEEP = 4      # nb de matchers conservés dans le cache
+
+# Tokens : mots, et chaque caractère de ponctuation (préserve 'beta-blocker' != 'beta blocker')
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+# Mêmes tokens avec l'espacement qui les précède : un nom en plusieurs tokens ne matche qu'avec
+# son espacement d'origine ('5-fluorouracil' != '5 - fluorouracil', 'a b' != 'a\n\nb')
+_SPACED_TOKEN = re.compile(r"(\s*)(?:\w+|[^\w\s])")
+UNKNOWN_TOKEN = -1
+
+def tokenize(text: str | None) -> list[str]:
+    """Tokens d'un texte normalisé (normalize_text : mojibake, NFKC, casefold)."""
+    return _TOKEN.findall(normalize_text(text))
+
+def spacings(text: str | None) -> list[str]:
+    """Espacement devant chaque token de tokenize(text) ("" si accolé au précédent)."""
+    return _SPACED_TOKEN.findall(normalize_text(text))
 
 def build_patterns(drugs: pd.DataFrame):
-    """Construit la liste (atccode, drug, pattern) pour tous les médicaments."""
-    return [(r["atccode"], r["drug"], build_drug_pattern(r["drug"])) for _, r in drugs.iterrows()]
+    """Construit la liste (atccode, drug, tokens du nom normalisé) pour tous les médicaments."""
+    return [(a, d, tuple(tokenize(str(d)))) for a, d in zip(drugs["atccode"].tolist(), drugs["drug"].tolist())]
+
+@dataclass
+class TitleTokens:
+    """Titres pré-tokenisés d'un bloc, au format CSR : les tokens du titre i sont
+    ids[offsets[i]:offsets[i+1]] (identifiants du vocabulaire du matcher, UNKNOWN_TOKEN sinon).
+    Normalisation et découpage ne sont faits qu'une fois par publication."""
+    ids: np.ndarray       # int32
+    offsets: np.ndarray   # int64, len(titres) + 1
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def encode(cls, titles: Iterable[str | None], vocab: dict[str, int]) -> "TitleTokens":
+        ids, offsets = array("i"), array("q", [0])
+        get = vocab.get
+        for title in titles:
+            ids.extend([get(t, UNKNOWN_TOKEN) for t in tokenize(title)])
+            offsets.append(len(ids))
+        return cls(np.frombuffer(ids, dtype=np.int32), np.frombuffer(offsets, dtype=np.int64))
+
+@dataclass
+class DrugMatcher:
+    """Index de matching par séquences de tokens : chaque nom de médicament est normalisé et
+    tokenisé comme les titres ; un médicament est cité si sa séquence d'identifiants de tokens
+    apparaît dans celle du titre (mots entiers, sans regex ni repli de casse par médicament).
+    Pour un nom en plusieurs tokens, l'espacement entre ses tokens doit aussi être celui du nom :
+    il n'est calculé que pour les titres qui contiennent toute la séquence.
+    """
+    patterns: list
+    vocab: dict[str, int] = field(default_factory=dict)                       # token -> identifiant
+    # 1er token -> (pattern, tokens suivants, espacements devant ces tokens)
+    by_first: dict[int, list[tuple[int, tuple, tuple]]] = field(default_factory=dict)
+
+    def search_ids(self, ids: list[int], title: str | None) -> list[int]:
+        """Indices (triés) des patterns dont la séquence apparaît dans `ids` (tokens de `title`)."""
+        found = set()
+        by_first = self.by_first
+        gaps = None
+        for pos, tok in enumerate(ids):
+            if tok < 0:
+                continue
+            for i, rest, spacing in by_first.get(tok, ()):
+                if not rest:
+                    found.add(i)
+                elif tuple(ids[pos + 1:pos + 1 + len(rest)]) == rest:
+                    if gaps is None:
+                        gaps = spacings(title)
+                    if tuple(gaps[pos + 1:pos + 1 + len(rest)]) == spacing:
+                        found.add(i)
+        return sorted(found)
+
+    def search(self, title: str) -> list[int]:
+        """Indices des patterns qui matchent le titre, dans l'ordre de `patterns`."""
+        get = self.vocab.get
+        return self.search_ids([get(t, UNKNOWN_TOKEN) for t in tokenize(title)], title)
+
+    def encode(self, titles: Iterable[str | None]) -> TitleTokens:
+        return TitleTokens.encode(titles, self.vocab)
+
+    @cached_property
+    def drug_table(self) -> pd.DataFrame:
+        """Table (atccode, drug) en texte, indexée par indice de pattern (référencée par CompactEdges)."""
+        return pd.DataFrame({"atccode": [str(a) for a, _, _ in self.patterns],
+                             "drug": [str(d) for _, d, _ in self.patterns]})
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("drug_table", None)   # recalculée à la demande, hors cache/workers
+        return state
+
+def build_matcher(drug_patterns) -> DrugMatcher:
+    """Construit le DrugMatcher à partir de la liste (atccode, drug, tokens) de build_patterns."""
+    m = DrugMatcher(patterns=list(drug_patterns))
+    for i, (_, name, tokens) in enumerate(m.patterns):
+        if not tokens:
+            continue      # nom vide après normalisation : jamais cité
+        ids = tuple(m.vocab.setdefault(t, len(m.vocab)) for t in tokens)
+        m.by_first.setdefault(ids[0], []).append((i, ids[1:], tuple(spacings(str(name))[1:])))
+    return m
+
+def matcher_key(drugs: pd.DataFrame) -> str:
+    """Empreinte du dictionnaire (atccode, drug) normalisé et de la version du matcher."""
+    h = hashlib.sha256(f"{MATCHER_VERSION}|{sys.version_info[0]}.{sys.version_info[1]}\n".encode())
+    for a, d in zip(drugs["atccode"].tolist(), drugs["drug"].tolist()):
+        h.update(f"{a!r}\t{d!r}\n".encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+def matcher_cache_fp(drugs: pd.DataFrame, cache_dir: Path) -> Path:
+    return cache_dir / f"matcher-{matcher_key(drugs)[:24]}.pkl"
+
+def _read_matcher(fp: Path) -> DrugMatcher | None:
+    try:
+        with fp.open("rb") as f:
+            m = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    return m if isinstance(m, DrugMatcher) else None
+
+def load_or_build_matcher(drugs: pd.DataFrame, cache_fp: Path | None) -> tuple[DrugMatcher, bool]:
+    """Matcher du dictionnaire `drugs`, relu depuis `cache_fp` s'il existe (sinon construit puis
+    écrit atomiquement ; seuls les matchers utilisés le plus récemment sont gardés dans le dossier).
+    Renvoie (matcher, trouvé en cache)."""
+    if cache_fp is None:
+        return build_matcher(build_patterns(drugs)), False
+    m = _read_matcher(cache_fp) if cache_fp.exists() else None
+    if m is not None:
+        # mtime = dernière utilisation : un matcher encore servi n'est pas purgé avant les autres
+        try:
+            os.utime(cache_fp)
+        except OSError:
+            pass
+        return m, True
+    m = build_matcher(build_patterns(drugs))
+    cache_fp.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_fp.with_name(f"{cache_fp.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(m, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cache_fp)
+    old = sorted(cache_fp.parent.glob("matcher-*.pkl"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in old[_MATCHER_CACHE_KEEP:]:
+        p.unlink(missing_ok=True)
+    return m, False
 
-def find_mentions(df: pd.DataFrame, source: str, drug_patterns) -> pd.DataFrame:
+def _text_column(df: pd.DataFrame, col: str) -> list:
+    """Colonne en texte Python (str(v), "" si manquante), comme attendu par le matching."""
+    if col not in df:
+        return [""] * len(df)
+    return [str(v) if pd.notnull(v) else "" for v in df[col].tolist()]
+
+def match_rows(df: pd.DataFrame, matcher: DrugMatcher) -> tuple[np.ndarray, np.ndarray]:
+    """Mentions sous forme d'indices : (position de la publication dans `df`, indice du pattern),
+    dans l'ordre des lignes puis des patterns."""
+    titles = _text_column(df, "title")
+    tokens = matcher.encode(titles)
+    ids, offsets = tokens.ids.tolist(), tokens.offsets.tolist()
+    rows, drugs = array("i"), array("i")
+    for pos in range(len(tokens)):
+        for i in matcher.search_ids(ids[offsets[pos]:offsets[pos + 1]], titles[pos]):
+            rows.append(pos)
+            drugs.append(i)
+    return np.frombuffer(rows, dtype=np.int32), np.frombuffer(drugs, dtype=np.int32)
+
+@dataclass
+class CompactEdges:
+    """Edges compacts : chaque mention ne stocke que deux entiers (publication, médicament).
+    - pubs  : une ligne par publication citée (source/journal catégoriels, pub_id, title, date)
+    - drugs : atccode/drug indexés par l'indice de pattern du matcher
+    Les titres ne sont copiés qu'une fois par publication ; voir to_frame() pour la forme longue.
+    """
+    pubs: pd.DataFrame
+    drugs: pd.DataFrame
+    pub: np.ndarray
+    drug: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.pub)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.pub) == 0
+
+    @classmethod
+    def from_rows(cls, df: pd.DataFrame, source: str, matcher: DrugMatcher,
+                  rows: np.ndarray, drugs: np.ndarray) -> "CompactEdges":
+        """Construit les edges d'un bloc à partir du résultat de match_rows."""
+        cited, pub = np.unique(rows, return_inverse=True)
+        sub = df.iloc[cited]
+        pid = sub["id"].tolist() if "id" in sub else [None] * len(sub)
+        pubs = pd.DataFrame({
+            "source": pd.Categorical([source] * len(sub)),
+            "pub_id": pd.Series([None if pd.isna(v) else str(v).strip() for v in pid], dtype=object),
+            "title": pd.Series(_text_column(sub, "title"), dtype=object),
+            "journal": pd.Categorical(_text_column(sub, "journal")),
+            "date": pd.Series(sub["date_iso"].tolist() if "date_iso" in sub else [None] * len(sub), dtype=object),
+        })
+        return cls(pubs, matcher.drug_table, pub.astype(np.int32), drugs.astype(np.int32))
+
+    @classmethod
+    def concat(cls, parts: list["CompactEdges"], drugs: pd.DataFrame) -> "CompactEdges":
+        """Concatène des blocs (même matcher) en décalant les indices de publication."""
+        parts = [p for p in parts if not p.empty]
+        if not parts:
+            empty = pd.DataFrame({"source": pd.Categorical([]), "pub_id": [], "title": [],
+                                  "journal": pd.Categorical([]), "date": []})
+            return cls(empty, drugs, np.zeros(0, np.int32), np.zeros(0, np.int32))
+        offsets = np.cumsum([0] + [len(p.pubs) for p in parts[:-1]])
+        pubs = pd.concat([p.pubs for p in parts], ignore_index=True)
+        for col in ("source", "journal"):
+            pubs[col] = pubs[col].astype("category")
+        return cls(pubs, drugs,
+                   np.concatenate([p.pub + o for p, o in zip(parts, offsets)]).astype(np.int32),
+                   np.concatenate([p.drug for p in parts]))
+
+    def to_frame(self) -> pd.DataFrame:
+        """Forme longue (colonnes EDGE_COLUMNS), comme find_mentions."""
+        take = lambda s, idx: pd.Series(s.to_numpy(dtype=object)[idx], dtype=object)
+        return pd.DataFrame({
+            "drug_atccode": take(self.drugs["atccode"], self.drug),
+            "drug_name": take(self.drugs["drug"], self.drug),
+            "source": take(self.pubs["source"], self.pub),
+            "pub_id": take(self.pubs["pub_id"], self.pub),
+            "title": take(self.pubs["title"], self.pub),
+            "journal": take(self.pubs["journal"], self.pub),
+            "date": take(self.pubs["date"], self.pub),
+        }, columns=EDGE_COLUMNS)
+
+def find_mentions_compact(df: pd.DataFrame, source: str, matcher: DrugMatcher) -> CompactEdges:
+    """find_mentions en représentation compacte (voir CompactEdges)."""
+    rows, drugs = match_rows(df, matcher)
+    return CompactEdges.from_rows(df, source, matcher, rows, drugs)
+
+def find_mentions(df: pd.DataFrame, source: str, drug_patterns, keep_row: bool = False) -> pd.DataFrame:
     """Renvoie un DataFrame 'edges' : une ligne par mention (médicament trouvé dans le titre).
     Colonnes : drug_atccode, drug_name, source, pub_id, title, journal, date
+    (+ 'row' : position de la publication dans `df` si keep_row=True)
+    `drug_patterns` : liste issue de build_patterns() ou DrugMatcher déjà construit.
     """
-    records = []
-    for row in df.itertuples(index=False):
-        title = str(getattr(row, "title", "")) if pd.notnull(getattr(row, "title", "")) else ""
-        journal = str(getattr(row, "journal", "")) if pd.notnull(getattr(row, "journal", "")) else ""
-        pid = getattr(row, "id", None)
-        date_iso = getattr(row, "date_iso", None)
-        for atccode, drug_name, pat in drug_patterns:
-            if pat.search(title):
-                records.append({
-                    "drug_atccode": str(atccode),
-                    "drug_name": str(drug_name),
-                    "source": source,
-                    "pub_id": None if pd.isna(pid) else str(pid).strip(),
-                    "title": title,
-                    "journal": journal,
-                    "date": date_iso
-                })
-    return pd.DataFrame.from_records(records)
+    matcher = drug_patterns if isinstance(drug_patterns, DrugMatcher) else build_matcher(drug_patterns)
+    rows, drugs = match_rows(df, matcher)
+    edges = CompactEdges.from_rows(df, source, matcher, rows, drugs).to_frame()
+    if keep_row:
+        edges["row"] = rows.astype(int)
+    return edges
+
+def split_shards(df: pd.DataFrame, n_shards: int) -> Iterator[pd.DataFrame]:
+    """Découpe un DataFrame en au plus `n_shards` tranches contiguës (ordre conservé)."""
+    size = max(1, -(-len(df) // max(1, n_shards)))
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+_WORKER_MATCHER: DrugMatcher | None = None
+
+def _init_worker(matcher: DrugMatcher | Path) -> None:
+    """Reçoit le matcher (ou le chemin de son cache) une seule fois par processus worker."""
+    global _WORKER_MATCHER
+    _WORKER_MATCHER = _read_matcher(matcher) if isinstance(matcher, Path) else matcher
+
+def _match_shard_rows(df: pd.DataFrame, source: str) -> tuple[np.ndarray, np.ndarray]:
+    return match_rows(df, _WORKER_MATCHER)
+
+def _mp_context():
+    """Démarrage des workers sans fork du processus courant : les threads de chargement (io_threads)
+    peuvent encore tourner, et un fork pendant qu'ils tiennent un verrou peut bloquer le worker.
+    Les workers ré-importent le script appelant : un programme qui lance le matching avec
+    workers > 1 doit protéger son point d'entrée par `if __name__ == "__main__":`."""
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    ctx = multiprocessing.get_context("forkserver")
+    # Modules importés une fois par le serveur (mono-thread) plutôt que par chaque worker
+    ctx.set_forkserver_preload([__name__])
+    return ctx
+
+def _pool_ordered(shards: Iterable[tuple[pd.DataFrame, str]], matcher: DrugMatcher | Path, workers: int,
+                  task) -> Iterator[tuple[pd.DataFrame, str, object]]:
+    """(shard, source, résultat de task) dans l'ordre d'entrée ; au plus 2×workers shards en vol."""
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context(), initializer=_init_worker,
+                             initargs=(matcher,)) as ex:
+        pending: deque = deque()
+        for df, source in shards:
+            pending.append((df, source, ex.submit(task, df, source)))
+            if len(pending) >= 2 * workers:
+                df0, source0, fut = pending.popleft()
+                yield df0, source0, fut.result()
+        while pending:
+            df0, source0, fut = pending.popleft()
+            yield df0, source0, fut.result()
+
+def find_mentions_parallel_compact(shards: Iterable[tuple[pd.DataFrame, str]], matcher: DrugMatcher,
+                                   workers: int, worker_matcher: DrugMatcher | Path | None = None
+                                   ) -> Iterator[CompactEdges]:
+    """Matching multi-processus : renvoie les edges compacts de chaque (shard, source) dans l'ordre
+    d'entrée. Le matcher (ou `worker_matcher`, ex. le chemin de son cache relu par chaque worker)
+    est transmis une fois par worker ; au plus 2×workers shards sont en vol, ce qui permet de
+    consommer un itérateur de blocs sans le charger en entier. Les workers ne renvoient que les
+    indices (publication, pattern) : les edges sont construits dans le processus principal."""
+    for df, source, (rows, drugs) in _pool_ordered(shards, worker_matcher or matcher, workers, _match_shard_rows):
+        yield CompactEdges.from_rows(df, source, matcher, rows, drugs)
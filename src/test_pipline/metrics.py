@@ -0,0 +1,195 @@
+from __future__ import annotations
+import cProfile
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:          # Windows : pas de getrusage
+    resource = None
+
+PROFILERS = ("cprofile", "sample")
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus (Mo), None si indisponible."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class RunMetrics:
+    """Mesures par étape : temps mur, temps CPU (du thread qui exécute l'étape), pic
+    tracemalloc (si trace_memory) et nb de lignes traitées ; le pic RSS, propre au processus,
+    n'est rapporté qu'une fois pour le run (total.process_peak_rss_mb).
+    Les étapes peuvent s'imbriquer (ex. lecture tirée par le matching en streaming) :
+    les temps rapportés sont exclusifs (le temps des sous-étapes est retiré du parent)
+    et une même étape peut être ré-ouverte (les mesures s'additionnent).
+    Depuis un autre thread (lecture concurrente), `timed` cumule temps mur et CPU du thread
+    hors pile d'étapes : les temps de threads parallèles s'additionnent.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.counts: Dict[str, int] = {}
+        self._stack: List[Dict[str, float]] = []
+        self._lock = threading.Lock()
+        self._owner = threading.get_ident()
+        self._t0 = time.perf_counter()
+        self._c0 = time.process_time()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stats(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            return self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0, "rows": 0,
+                                                 "peak_traced_mb": None})
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mesure le bloc sous le nom `name` ; renvoie les stats de l'étape (clé "rows" modifiable)."""
+        st = self._stats(name)
+        frame = {"child_wall": 0.0, "child_cpu": 0.0, "peak": 0}
+        if self.trace_memory:
+            if self._stack:   # le pic du parent avant la sous-étape serait perdu au reset
+                parent = self._stack[-1]
+                parent["peak"] = max(parent["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        w0, c0 = time.perf_counter(), time.thread_time()
+        try:
+            yield st
+        finally:
+            wall, cpu = time.perf_counter() - w0, time.thread_time() - c0
+            self._stack.pop()
+            with self._lock:
+                st["wall_s"] += wall - frame["child_wall"]
+                st["cpu_s"] += cpu - frame["child_cpu"]
+                st["calls"] += 1
+            if self.trace_memory:
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                st["peak_traced_mb"] = max(st["peak_traced_mb"] or 0.0, round(peak / 2**20, 1))
+            else:
+                peak = 0
+            if self._stack:
+                parent = self._stack[-1]
+                parent["child_wall"] += wall
+                parent["child_cpu"] += cpu
+                parent["peak"] = max(parent["peak"], peak)
+
+    @contextmanager
+    def timed(self, name: str):
+        """Comme `stage`, utilisable depuis n'importe quel thread : dans le thread qui a créé
+        les métriques, c'est `stage` ; ailleurs, temps mur et CPU du thread (time.thread_time),
+        cumulés sous verrou. Les lignes sont à ajouter dans le dict renvoyé ("rows")."""
+        if threading.get_ident() == self._owner:
+            with self.stage(name) as st:
+                yield st
+            return
+        st = self._stats(name)
+        local = {"rows": 0}
+        w0, c0 = time.perf_counter(), time.thread_time()
+        try:
+            yield local
+        finally:
+            wall, cpu = time.perf_counter() - w0, time.thread_time() - c0
+            with self._lock:
+                st["wall_s"] += wall
+                st["cpu_s"] += cpu
+                st["calls"] += 1
+                st["rows"] += local["rows"]
+
+    def timed_iter(self, name: str, items: Iterable, rows: Callable[[Any], int] = lambda _: 1) -> Iterator:
+        """Itère sur `items` en comptant chaque production d'élément dans l'étape `name`."""
+        it = iter(items)
+        while True:
+            with self.stage(name) as st:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                st["rows"] += rows(item)
+            yield item
+
+    def count(self, key: str, n: int) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + int(n)
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages = {k: {**v, "wall_s": round(v["wall_s"], 4), "cpu_s": round(v["cpu_s"], 4)}
+                  for k, v in self.stages.items()}
+        return {"total": {"wall_s": round(time.perf_counter() - self._t0, 4),
+                          "cpu_s": round(time.process_time() - self._c0, 4),
+                          "process_peak_rss_mb": peak_rss_mb()},
+                "stages": stages,
+                "counts": dict(self.counts)}
+
+    def write(self, fp: Path, **extra: Any) -> Dict[str, Any]:
+        data = {**extra, **self.to_dict()}
+        fp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        return data
+
+class _Sampler(threading.Thread):
+    """Profileur par échantillonnage (stdlib) : relève la pile du thread principal
+    toutes les `interval` secondes ; sortie en piles repliées (format flamegraph)."""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.target = threading.main_thread().ident
+        self.samples: Counter = Counter()
+        self._stop_evt = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_evt.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join()
+
+@contextmanager
+def profiled(kind: Optional[str], out_dir: Path):
+    """Profilage optionnel du bloc : "cprofile" -> out_dir/profile.pstats (+ profile.txt),
+    "sample" -> out_dir/profile_samples.txt (piles repliées), None -> rien."""
+    if kind is None:
+        yield
+        return
+    if kind not in PROFILERS:
+        raise ValueError(f"profilage inconnu : {kind!r} (attendu : {', '.join(PROFILERS)})")
+    if kind == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(out_dir / "profile.pstats")
+            with (out_dir / "profile.txt").open("w", encoding="utf-8") as f:
+                pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(40)
+            print(f"[ok] profil cProfile → {out_dir / 'profile.pstats'}")
+    else:
+        sampler = _Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            fp = out_dir / "profile_samples.txt"
+            fp.write_text("".join(f"{s} {n}\n" for s, n in sampler.samples.most_common()), encoding="utf-8")
+            print(f"[ok] profil échantillonné → {fp} ({sum(sampler.samples.values())} échantillons)")
@@ -0,0 +1,104 @@
+"""Sortie par ATC partitionnée par 1re lettre du code : un fichier par groupe et un manifeste."""
+from __future__ import annotations
+import hashlib
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .ranking import JournalCounter, iter_atc_records
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+OUTPUT_LAYOUTS = ("single", "partitioned", "both")   # Config.output_layout
+
+def shard_key(atccode: Any) -> str:
+    """Nom de la partition d'un code ATC : sa 1re lettre en majuscule ("_" si non alphanumérique)."""
+    c = str(atccode)[:1].upper()
+    return c if c.isascii() and c.isalnum() else "_"
+
+def in_prefixes(atccode: str, prefixes: Optional[List[str]]) -> bool:
+    """Le code ATC commence-t-il par l'un des `prefixes` (en majuscules ; None = tous) ?"""
+    return prefixes is None or str(atccode).upper().startswith(tuple(prefixes))
+
+def manifest_fp(path: Path) -> Path:
+    """Manifeste d'une sortie partitionnée (`path` : le dossier ou le manifeste lui-même)."""
+    path = Path(path)
+    return path / MANIFEST_NAME if path.is_dir() else path
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    fp = manifest_fp(path)
+    manifest = json.loads(fp.read_text(encoding="utf-8"))
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Manifeste de version inconnue ({fp}) : {manifest.get('version')!r}")
+    return manifest
+
+def select_shards(path: Path, prefixes: Optional[Iterable[str]] = None) -> List[Tuple[Path, Dict[str, Any]]]:
+    """(fichier, entrée du manifeste) des partitions à lire, dans l'ordre des codes ATC ;
+    `prefixes` (ex. ["N", "A04"]) restreint aux seules partitions qui peuvent les contenir."""
+    fp = manifest_fp(path)
+    shards = read_manifest(fp)["shards"]
+    names = sorted(shards) if prefixes is None else sorted({shard_key(p) for p in prefixes} & set(shards))
+    return [(fp.parent / shards[n]["file"], shards[n]) for n in names]
+
+def verify_shard(fp: Path, info: Dict[str, Any], block_size: int = 1 << 20) -> None:
+    """Contrôle taille et sha256 d'une partition (ValueError si le fichier ne correspond pas)."""
+    sha = hashlib.sha256()
+    with fp.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    if fp.stat().st_size != info["bytes"] or sha.hexdigest() != info["sha256"]:
+        raise ValueError(f"Partition altérée ou incomplète : {fp}")
+
+def _read_shard(fp: Path, info: Dict[str, Any], prefixes: Optional[List[str]], verify: bool) -> List[Tuple[str, dict]]:
+    if verify:
+        verify_shard(fp, info)
+    return [(k, obj) for k, obj in iter_atc_records(fp) if in_prefixes(k, prefixes)]
+
+def _count_shard(fp: Path, info: Dict[str, Any], prefixes: Optional[List[str]], verify: bool,
+                 source: Optional[str], start: Optional[str], end: Optional[str]) -> JournalCounter:
+    if verify:
+        verify_shard(fp, info)
+    return JournalCounter(source, start, end).update((k, obj) for k, obj in iter_atc_records(fp) if in_prefixes(k, prefixes))
+
+def _prefixes(prefixes: Optional[Iterable[str]]) -> Optional[List[str]]:
+    return None if prefixes is None else [str(p).upper() for p in prefixes]
+
+def iter_partitioned(path: Path, prefixes: Optional[Iterable[str]] = None, workers: int = 1,
+                     verify: bool = False) -> Iterator[Tuple[str, dict]]:
+    """Entrées par ATC des partitions retenues, dans l'ordre des codes ATC. Avec workers > 1,
+    les partitions sont lues par un pool de threads, au plus `workers` partitions d'avance."""
+    prefixes = _prefixes(prefixes)
+    shards = select_shards(path, prefixes)
+    if workers <= 1:
+        for fp, info in shards:
+            if verify:
+                verify_shard(fp, info)
+            yield from ((k, obj) for k, obj in iter_atc_records(fp) if in_prefixes(k, prefixes))
+        return
+    with ThreadPoolExecutor(workers) as pool:
+        ahead: List[Future] = []
+        todo = iter(shards)
+        for fp, info in todo:
+            ahead.append(pool.submit(_read_shard, fp, info, prefixes, verify))
+            if len(ahead) >= workers:
+                break
+        while ahead:
+            records = ahead.pop(0).result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                ahead.append(pool.submit(_read_shard, *nxt, prefixes, verify))
+            yield from records
+
+def rank_partitioned(path: Path, prefixes: Optional[Iterable[str]] = None, workers: int = 4,
+                     source: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None,
+                     verify: bool = False) -> JournalCounter:
+    """Classement des journaux sur les partitions retenues : un JournalCounter par partition
+    (pool de threads), fusionnés ensuite (chaque code ATC n'est que dans une partition)."""
+    prefixes = _prefixes(prefixes)
+    shards = select_shards(path, prefixes)
+    total = JournalCounter(source, start, end)
+    count = lambda s: _count_shard(*s, prefixes, verify, source, start, end)
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        for part in (pool.map(count, shards) if workers > 1 else map(count, shards)):
+            total.merge(part)
+    return total
@@ -1,52 +1,136 @@
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, ExitStack
 from datetime import datetime, timezone
-import json, math
-import pandas as pd
+import importlib.util
+import os
+from pathlib import Path
 from .config import Config
-from .io import read_drugs, read_pubmed, read_clinical_trials
-from .clean import add_iso_date
-from .match import build_patterns, find_mentions
-from .aggregate import build_by_atc
-
-def _clean_nans(obj):
-    """Remplace tous les NaN/NaT/Inf par None dans une structure Python imbriquée."""
-    import pandas as pd
-    import math
-    if obj is None:
-        return None
-    if isinstance(obj, float) and (math.isnan(obj) or obj in (float("inf"), float("-inf"))):
-        return None
-    if isinstance(obj, (pd.Timestamp,)):
-        return obj.strftime("%Y-%m-%d")
-    if isinstance(obj, dict):
-        return {k: _clean_nans(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_clean_nans(x) for x in obj]
-    return obj
-
-def run_pipeline(cfg: Config) -> None:
+from .io import write_by_atc, tee_columnar, tee_partitioned, write_journal_index
+from .identity import dedup_publications
+from .loading import load_inputs, wait_loaded
+from .match import (CompactEdges, DrugMatcher, find_mentions_compact, find_mentions_parallel_compact,
+                    split_shards)
+from .aggregate import iter_by_atc
+from .incremental import open_state, run_incremental, iter_fragments
+from .metrics import RunMetrics, profiled
+from .partition import MANIFEST_NAME, OUTPUT_LAYOUTS
+from .store import tee_store
+from .ranking import JournalCounter
+
+def _match(shards, matcher: DrugMatcher, workers: int, worker_matcher=None) -> CompactEdges:
+    """Matching des (DataFrame, source) en série ou dans un pool de processus ;
+    les edges compacts sont concaténés dans l'ordre des shards (résultat identique au mode série)."""
+    if workers > 1:
+        parts = find_mentions_parallel_compact(shards, matcher, workers, worker_matcher)
+    else:
+        parts = (find_mentions_compact(df, source, matcher) for df, source in shards)
+    return CompactEdges.concat(list(parts), matcher.drug_table)
+
+def _dedup(frames, cfg: Config, metrics: RunMetrics):
+    """Étape d'identité : doublons retirés par source (index de clés canoniques partagé
+    entre blocs, pubmed.csv/json/parquet confondus) et IDs auto attribués avant le matching."""
+    seen: dict[str, set] = {}
+    for df, source in frames:
+        with metrics.stage("dedup") as st:
+            df, dropped = dedup_publications(df, seen.setdefault(source, set()), cfg.generate_auto_id_if_empty)
+            st["rows"] += len(df)
+        metrics.count("duplicates", dropped)
+        yield df, source
+
+def run_pipeline(cfg: Config) -> dict:
     """Orchestration :
-    1) lecture des données → 2) dates ISO → 3) matching → 4) agrégation → 5) écriture JSON
+    1) lecture des données → 2) dates ISO → 3) dédoublonnage / IDs → 4) matching → 5) agrégation
+    → 6) écriture JSON (streaming), et au fil du flux : Parquet, store SQLite, index des journaux
+    Si cfg.io_threads > 1, les sources sont lues et parsées en parallèle (threads), le matcher
+    est compilé pendant la lecture et pubmed est matché sans attendre les essais cliniques ;
+    si cfg.chunk_size est défini, les étapes 1 à 3 sont faites en streaming, bloc par bloc ;
+    si cfg.workers > 1, le matching est réparti sur un pool de processus ;
+    si cfg.incremental, seules les publications/médicaments nouveaux sont matchés (état SQLite).
+    Chaque étape est mesurée (temps, mémoire, lignes) : les métriques sont écrites dans
+    cfg.metrics_fp et renvoyées.
     """
+    if cfg.output_layout not in OUTPUT_LAYOUTS:
+        raise ValueError(f"Disposition de sortie inconnue: {cfg.output_layout!r} (attendu: {OUTPUT_LAYOUTS})")
     cfg.out_dir.mkdir(parents=True, exist_ok=True)
+    metrics = RunMetrics(trace_memory=cfg.trace_memory)
 
-    drugs = read_drugs(cfg.drugs_fp)
-    pubmed = read_pubmed(cfg.pubmed_csv_fp, cfg.pubmed_json_fp)
-    ctrials = read_clinical_trials(cfg.ctrials_fp)
+    with profiled(cfg.profile, cfg.out_dir):
+        n_atc = _run(cfg, metrics)
 
-    pubmed  = add_iso_date(pubmed,  dayfirst=cfg.parse_dayfirst)
-    ctrials = add_iso_date(ctrials, dayfirst=cfg.parse_dayfirst)
+    generated_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00","Z")
+    output = cfg.partition_dir / MANIFEST_NAME if cfg.output_layout == "partitioned" else cfg.by_atc_json_fp
+    out = metrics.write(cfg.metrics_fp, generated_at=generated_at, output=str(output),
+                        chunk_size=cfg.chunk_size, workers=cfg.n_workers, incremental=cfg.incremental)
+    if cfg.output_layout != "single":
+        print(f"[ok] partitions par groupe ATC → {cfg.partition_dir} ({n_atc} ATC, {cfg.output_format})")
+    if cfg.output_layout != "partitioned":
+        print(f"[ok] JSON écrit → {cfg.by_atc_json_fp} ({n_atc} ATC, {cfg.output_format})")
+    print(f"[ok] métriques → {cfg.metrics_fp} ({out['total']['wall_s']:.2f} s)")
+    print(f"[ok] generated_at = {generated_at}")
+    return out
 
-    patterns = build_patterns(drugs)
-    edges_pub = find_mentions(pubmed,  "pubmed",         patterns)
-    edges_ct  = find_mentions(ctrials, "clinical_trial", patterns)
-    edges = pd.concat([edges_pub, edges_ct], ignore_index=True)
+def _run(cfg: Config, metrics: RunMetrics) -> int:
+    """Corps de run_pipeline ; renvoie le nombre d'ATC écrits."""
+    workers = cfg.n_workers
+    with ExitStack() as stack:
+        pool = stack.enter_context(ThreadPoolExecutor(cfg.io_threads)) if cfg.io_threads > 1 else None
+        # Lecture/parsing des sources et compilation du matcher en parallèle (si io_threads > 1)
+        loaded, frames = load_inputs(cfg, metrics, pool, with_matcher=not cfg.incremental)
+        if cfg.dedup_publications:
+            frames = _dedup(frames, cfg, metrics)
 
-    by_atc = build_by_atc(edges, generate_auto_id_if_empty=cfg.generate_auto_id_if_empty)
-    payload = _clean_nans(by_atc)
+        if cfg.incremental:
+            drugs, _, _ = wait_loaded(loaded, metrics)
+            conn = stack.enter_context(closing(open_state(cfg.state_fp, cfg)))
+            with metrics.stage("incremental"):
+                run_incremental(conn, cfg, drugs, frames)
+            entries = iter_fragments(conn)
+        else:
+            _, matcher, cache_fp = wait_loaded(loaded, metrics)
+            with metrics.stage("match") as st:
+                if workers > 1 and not cfg.chunk_size:
+                    frames = ((part, source) for df, source in frames for part in split_shards(df, 4 * workers))
+                # Les workers relisent le matcher depuis le cache plutôt que de le recevoir du parent ;
+                # pubmed est matché dès qu'il est prêt, pendant que les essais se chargent encore
+                edges = _match(frames, matcher, workers, cache_fp)
+                st["rows"] += len(edges)
+            metrics.count("edges", len(edges))
+            # Chaque entrée ATC est écrite dès qu'elle est agrégée (pas de dict complet en mémoire)
+            entries = iter_by_atc(edges, generate_auto_id_if_empty=cfg.generate_auto_id_if_empty)
+        entries = metrics.timed_iter("aggregate", entries)
 
-    generated_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00","Z")
-    with cfg.by_atc_json_fp.open("w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2, allow_nan=False)
-    print(f"[ok] JSON écrit → {cfg.by_atc_json_fp}")
-    print(f"[ok] generated_at = {generated_at}")
+        side_outputs: list[Path] = []
+        if cfg.columnar_output:
+            if importlib.util.find_spec("pyarrow") is None:
+                print("[warn] pyarrow absent : sorties Parquet ignorées")
+            else:
+                entries = metrics.timed_iter("parquet", tee_columnar(entries, cfg.edges_parquet_fp,
+                                                                     cfg.journals_parquet_fp))
+                side_outputs += [cfg.edges_parquet_fp, cfg.journals_parquet_fp]
+        if cfg.query_store:
+            entries = metrics.timed_iter("store", tee_store(entries, cfg.store_fp))
+            side_outputs.append(cfg.store_fp)
+        ranking = JournalCounter()
+        if cfg.journal_index:
+            entries = ranking.tee(entries)
+        with metrics.stage("write") as st:
+            if cfg.output_layout != "single":
+                # Un fichier par groupe anatomique ATC, écrits par un pool de threads
+                entries = tee_partitioned(entries, cfg.partition_dir, cfg.output_format, workers=cfg.io_threads)
+            else:
+                # Partitions d'un run précédent : plus à jour, le manifeste n'est plus proposé aux lecteurs
+                (cfg.partition_dir / MANIFEST_NAME).unlink(missing_ok=True)
+            if cfg.output_layout == "partitioned":
+                n_atc = sum(1 for _ in entries)
+            else:
+                n_atc = write_by_atc(entries, cfg.by_atc_json_fp, cfg.output_format)
+            st["rows"] += n_atc
+            # Store et Parquet sont finalisés en fin de flux, juste avant la sortie principale :
+            # datés après elle pour que les lecteurs (tasks.is_fresh) les tiennent pour à jour
+            for fp in side_outputs:
+                os.utime(fp)
+            if cfg.journal_index:
+                write_journal_index(ranking.rows(), cfg.journal_index_fp)
+    metrics.count("atc", n_atc)
+    return n_atc
@@ -0,0 +1,151 @@
+"""Classement des journaux par nb de médicaments distincts, en une passe sur les entrées par ATC."""
+from __future__ import annotations
+import heapq
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Source -> liste de publications dans une entrée par ATC
+SOURCE_FIELDS = {"pubmed": "pubmed", "clinical_trial": "clinical_trials"}
+
+def _rank_key(row: Tuple[str, int]) -> Tuple[int, str]:
+    return -row[1], row[0]
+
+def _journal_spans(obj: Dict[str, Any], source: Optional[str]) -> Dict[str, Tuple[Any, Any]]:
+    """journal -> (first_date, last_date) d'une entrée ; depuis le résumé "journals",
+    ou recalculé sur les publications de `source`."""
+    spans: Dict[str, Tuple[Any, Any]] = {}
+    if source is None:
+        for j in obj.get("journals") or []:
+            if isinstance(j, dict):
+                name = j.get("journal")
+                if name:
+                    spans[name] = (j.get("first_date"), j.get("last_date"))
+            elif isinstance(j, str) and j:
+                spans[j] = (None, None)
+        return spans
+    for item in obj.get(SOURCE_FIELDS[source]) or []:
+        name, d = item.get("journal"), item.get("date")
+        if not name:
+            continue
+        first, last = spans.get(name, (d, d))
+        if d is not None:
+            first = d if first is None or d < first else first
+            last = d if last is None or d > last else last
+        spans[name] = (first, last)
+    return spans
+
+class JournalCounter:
+    """Compteur incrémental journal -> nb de médicaments distincts (et nb de médicaments
+    pour lesquels le journal est le seul à les citer : journaux « exclusifs »).
+
+    source      : "pubmed" ou "clinical_trial" pour ne compter que cette source.
+    start / end : fenêtre de dates ISO (incluses) ; un couple journal/médicament compte si
+                  son intervalle [first_date, last_date] chevauche la fenêtre (non daté : exclu).
+    """
+
+    def __init__(self, source: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+        if source is not None and source not in SOURCE_FIELDS:
+            raise ValueError(f"source inconnue : {source!r} (attendu : {', '.join(SOURCE_FIELDS)})")
+        self.source, self.start, self.end = source, start, end
+        self.counts: Counter = Counter()
+        self.exclusive: Counter = Counter()
+        self.n_atc = 0
+
+    def _keep(self, first, last) -> bool:
+        if self.start is None and self.end is None:
+            return True
+        if first is None or last is None:
+            return False
+        return (self.end is None or first <= self.end) and (self.start is None or last >= self.start)
+
+    def add(self, atc: str, obj: Dict[str, Any]) -> None:
+        """Compte une entrée ATC."""
+        self.n_atc += 1
+        journals = [j for j, (first, last) in _journal_spans(obj, self.source).items() if self._keep(first, last)]
+        self.counts.update(journals)
+        if len(journals) == 1:
+            self.exclusive[journals[0]] += 1
+
+    def update(self, records: Iterable[Tuple[str, Dict[str, Any]]]) -> "JournalCounter":
+        for atc, obj in records:
+            self.add(atc, obj)
+        return self
+
+    def tee(self, records: Iterable[Tuple[str, Dict[str, Any]]]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Laisse passer les entrées en les comptant (écriture en streaming)."""
+        for atc, obj in records:
+            self.add(atc, obj)
+            yield atc, obj
+
+    def merge(self, other: "JournalCounter") -> "JournalCounter":
+        """Ajoute les comptes d'un compteur tenu sur d'autres codes ATC (ex. une autre partition)."""
+        self.counts.update(other.counts)
+        self.exclusive.update(other.exclusive)
+        self.n_atc += other.n_atc
+        return self
+
+    def rows(self) -> List[Tuple[str, int]]:
+        """(journal, nb de médicaments distincts), triés par (-nb, journal)."""
+        return sorted(self.counts.items(), key=_rank_key)
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        """Les k premiers de rows(), par tas (O(J log k)) sans trier tous les journaux."""
+        return heapq.nsmallest(k, self.counts.items(), key=_rank_key)
+
+    def exclusive_rows(self, k: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """(journal, nb de médicaments cités uniquement par ce journal, nb de médicaments distincts),
+        triés par (-exclusifs, journal) ; k premiers si fourni."""
+        items = ((j, n, self.counts[j]) for j, n in self.exclusive.items())
+        key = lambda r: (-r[1], r[0])
+        return heapq.nsmallest(k, items, key=key) if k is not None else sorted(items, key=key)
+
+def iter_atc_records(fp: Path, block_size: int = 1 << 16) -> Iterator[Tuple[str, dict]]:
+    """Relit une sortie par ATC (JSON pretty/compact ou NDJSON) entrée par entrée :
+    le JSON n'est jamais chargé en entier (décodage incrémental par blocs). Une entrée incomplète
+    double la lecture suivante : une grosse entrée est décodée O(log) fois, pas une fois par bloc."""
+    with fp.open(encoding="utf-8") as f:
+        if fp.suffix == ".ndjson":
+            for line in f:
+                if line.strip():
+                    obj = json.loads(line)
+                    yield str(obj.get("atccode")), obj
+            return
+        dec = json.JSONDecoder()
+        buf, pos, eof, opened, want = "", 0, False, False, block_size
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (opened and buf[pos] == ",")):
+                pos += 1
+            if pos < len(buf) and not opened:
+                if buf[pos] != "{":
+                    raise ValueError("Le JSON attendu est un dict indexé par codes ATC.")
+                opened, pos = True, pos + 1
+                continue
+            if pos < len(buf) and buf[pos] == "}":
+                return
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("buffer vide", buf, pos)
+                key, end = dec.raw_decode(buf, pos)
+                while end < len(buf) and buf[end].isspace():
+                    end += 1
+                if end >= len(buf):
+                    raise json.JSONDecodeError("buffer incomplet", buf, end)
+                if buf[end] != ":":
+                    raise ValueError(f"JSON par ATC invalide ({fp}) : ':' attendu")
+                end += 1
+                while end < len(buf) and buf[end].isspace():
+                    end += 1
+                obj, end = dec.raw_decode(buf, end)
+            except json.JSONDecodeError:
+                if eof:
+                    if pos >= len(buf):
+                        return
+                    raise
+                more = f.read(want)
+                eof, want = not more, want * 2
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield key, obj
+            pos, want = end, block_size
@@ -0,0 +1,177 @@
+"""Store SQLite des résultats (drugs, publications, edges, journaux) et ses requêtes usuelles."""
+from __future__ import annotations
+import json, os, sqlite3
+from argparse import ArgumentParser
+from contextlib import closing
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+STORE_VERSION = "1"
+SOURCES = (("pubmed", "pubmed"), ("clinical_trials", "clinical_trial"))
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE drugs (drug_id INTEGER PRIMARY KEY, atccode TEXT NOT NULL UNIQUE, drug TEXT);
+CREATE TABLE publications (pub_id INTEGER PRIMARY KEY, source TEXT, id TEXT, title TEXT,
+                           journal TEXT, date TEXT);
+CREATE TABLE edges (drug_id INTEGER, pos INTEGER, pub_id INTEGER, PRIMARY KEY (drug_id, pos)) WITHOUT ROWID;
+CREATE TABLE journal_drugs (journal TEXT, drug_id INTEGER, first_date TEXT, last_date TEXT,
+                            n_pubs INTEGER, PRIMARY KEY (journal, drug_id)) WITHOUT ROWID;
+CREATE TABLE journals (journal TEXT PRIMARY KEY, n_drugs INTEGER) WITHOUT ROWID;
+"""
+# Index créés après l'insertion en masse (plus rapide que de les maintenir ligne à ligne)
+_INDEXES = """
+CREATE INDEX edges_pub ON edges (pub_id, drug_id);
+CREATE INDEX publications_journal ON publications (journal, date);
+CREATE INDEX journal_drugs_drug ON journal_drugs (drug_id);
+CREATE INDEX journals_rank ON journals (n_drugs DESC, journal);
+INSERT INTO journals
+    SELECT journal, COUNT(*) FROM journal_drugs WHERE journal IS NOT NULL AND journal != '' GROUP BY journal;
+"""
+
+def _text(v) -> str | None:
+    return None if v is None else str(v)
+
+def tee_store(entries: Iterable[Tuple[str, Any]], fp: Path, batch_rows: int = 65536) -> Iterator[Tuple[str, Any]]:
+    """Laisse passer les entrées ATC tout en remplissant le store SQLite (fichier temporaire,
+    puis rename atomique en fin de flux). Une publication citée par plusieurs ATC n'est stockée
+    qu'une fois (clé : source, id, titre, journal, date)."""
+    tmp = fp.with_name(fp.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp)
+    ok = False
+    try:
+        conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + _SCHEMA)
+        pub_ids: Dict[tuple, int] = {}
+        pubs: List[tuple] = []
+        edges: List[tuple] = []
+        journals: List[tuple] = []
+
+        def flush() -> None:
+            conn.executemany("INSERT INTO publications VALUES (?, ?, ?, ?, ?, ?)", pubs)
+            conn.executemany("INSERT INTO edges VALUES (?, ?, ?)", edges)
+            conn.executemany("INSERT OR REPLACE INTO journal_drugs VALUES (?, ?, ?, ?, ?)", journals)
+            pubs.clear(); edges.clear(); journals.clear()
+
+        for drug_id, (key, obj) in enumerate(entries, start=1):
+            conn.execute("INSERT INTO drugs VALUES (?, ?, ?)", (drug_id, str(key), obj.get("drug")))
+            pos = 0
+            for field, source in SOURCES:
+                for item in obj.get(field) or []:
+                    pk = (source, _text(item.get("id")), item.get("title"), item.get("journal"), item.get("date"))
+                    pub_id = pub_ids.get(pk)
+                    if pub_id is None:
+                        pub_id = pub_ids[pk] = len(pub_ids) + 1
+                        pubs.append((pub_id, *pk))
+                    edges.append((drug_id, pos, pub_id))
+                    pos += 1
+            for j in obj.get("journals") or []:
+                journals.append((j.get("journal"), drug_id, j.get("first_date"), j.get("last_date"), j.get("n_pubs")))
+            if len(edges) + len(journals) >= batch_rows:
+                flush()
+            yield key, obj
+        flush()
+        conn.executescript(_INDEXES)
+        n_drugs = conn.execute("SELECT COUNT(*) FROM drugs").fetchone()[0]
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [("version", STORE_VERSION), ("n_drugs", str(n_drugs)),
+                                                            ("n_publications", str(len(pub_ids)))])
+        conn.commit()
+        ok = True
+    finally:
+        conn.close()
+        if ok:
+            os.replace(tmp, fp)
+        else:
+            tmp.unlink(missing_ok=True)
+
+def open_store(fp: Path) -> sqlite3.Connection:
+    """Connexion en lecture seule au store (FileNotFoundError s'il n'existe pas)."""
+    if not Path(fp).exists():
+        raise FileNotFoundError(fp)
+    conn = sqlite3.connect(f"{Path(fp).resolve().as_uri()}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def top_journals(conn: sqlite3.Connection, limit: int | None = None) -> List[Tuple[str, int]]:
+    """(journal, nb de médicaments distincts), triés par (-nb, journal) ; `limit` premiers si fourni."""
+    sql = "SELECT journal, n_drugs FROM journals ORDER BY n_drugs DESC, journal"
+    rows = conn.execute(sql + " LIMIT ?", (limit,)) if limit is not None else conn.execute(sql)
+    return [(r[0], int(r[1])) for r in rows]
+
+def publications_for_atc(conn: sqlite3.Connection, atccode: str, source: str | None = None) -> List[Dict[str, Any]]:
+    """Publications citant le code ATC (ordre d'écriture du JSON), éventuellement pour une source."""
+    sql = """SELECT p.source, p.id, p.title, p.date, p.journal FROM drugs d
+             JOIN edges e ON e.drug_id = d.drug_id JOIN publications p ON p.pub_id = e.pub_id
+             WHERE d.atccode = ?"""
+    args: list = [atccode]
+    if source:
+        sql += " AND p.source = ?"
+        args.append(source)
+    return [dict(r) for r in conn.execute(sql + " ORDER BY e.pos", args)]
+
+def drugs_in_journal(conn: sqlite3.Connection, journal: str, start: str | None = None,
+                     end: str | None = None) -> List[Dict[str, Any]]:
+    """Médicaments cités par `journal`, avec le nb de publications et les dates extrêmes ;
+    `start` / `end` (ISO, inclus) restreignent aux publications datées de la période."""
+    sql = """SELECT d.atccode, d.drug, COUNT(*) AS n_pubs, MIN(p.date) AS first_date, MAX(p.date) AS last_date
+             FROM publications p JOIN edges e ON e.pub_id = p.pub_id JOIN drugs d ON d.drug_id = e.drug_id
+             WHERE p.journal = ?"""
+    args: list = [journal]
+    if start:
+        sql += " AND p.date >= ?"
+        args.append(start)
+    if end:
+        sql += " AND p.date <= ?"
+        args.append(end)
+    sql += " GROUP BY d.drug_id ORDER BY n_pubs DESC, d.atccode"
+    return [dict(r) for r in conn.execute(sql, args)]
+
+def iter_records(conn: sqlite3.Connection, with_publications: bool = True) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Entrées par ATC reconstituées depuis le store, au format du JSON (journaux, et publications
+    réduites à journal/date si with_publications) : entrée des calculs de ranking.JournalCounter."""
+    journals = groupby(conn.execute("""SELECT drug_id, journal, first_date, last_date, n_pubs
+                                       FROM journal_drugs ORDER BY drug_id"""), key=lambda r: r[0])
+    pubs = groupby(conn.execute("""SELECT e.drug_id, p.source, p.journal, p.date FROM edges e
+                                   JOIN publications p ON p.pub_id = e.pub_id ORDER BY e.drug_id, e.pos""")
+                   if with_publications else (), key=lambda r: r[0])
+    fields = {s: f for f, s in SOURCES}
+    nj, np_ = next(journals, None), next(pubs, None)
+    for drug_id, atccode, drug in conn.execute("SELECT drug_id, atccode, drug FROM drugs ORDER BY drug_id"):
+        obj: Dict[str, Any] = {"drug": drug, "pubmed": [], "clinical_trials": [], "journals": []}
+        if nj is not None and nj[0] == drug_id:
+            obj["journals"] = [{"journal": j, "first_date": f, "last_date": l, "n_pubs": n} for _, j, f, l, n in nj[1]]
+            nj = next(journals, None)
+        if np_ is not None and np_[0] == drug_id:
+            for _, source, j, d in np_[1]:
+                obj[fields[source]].append({"journal": j, "date": d})
+            np_ = next(pubs, None)
+        yield atccode, obj
+
+def main(argv: list[str] | None = None) -> None:
+    p = ArgumentParser(description="Requêtes sur le store SQLite des résultats")
+    p.add_argument("store", type=Path)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("top-journals", help="journaux par nb de médicaments distincts")
+    q.add_argument("--limit", type=int, default=10)
+    q = sub.add_parser("atc", help="publications d'un code ATC")
+    q.add_argument("atccode")
+    q.add_argument("--source", choices=[s for _, s in SOURCES])
+    q = sub.add_parser("journal", help="médicaments cités par un journal")
+    q.add_argument("journal")
+    q.add_argument("--from", dest="start", help="date ISO de début (incluse)")
+    q.add_argument("--to", dest="end", help="date ISO de fin (incluse)")
+    args = p.parse_args(argv)
+
+    with closing(open_store(args.store)) as conn:
+        if args.cmd == "top-journals":
+            rows: list = [{"journal": j, "distinct_drugs": n} for j, n in top_journals(conn, args.limit)]
+        elif args.cmd == "atc":
+            rows = publications_for_atc(conn, args.atccode, args.source)
+        else:
+            rows = drugs_in_journal(conn, args.journal, args.start, args.end)
+    for r in rows:
+        print(json.dumps(r, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
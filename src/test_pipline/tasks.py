@@ -0,0 +1,125 @@
+"""API légère des tâches ETL (extract / transform / load), appelable en process par Airflow.
+
+Les imports lourds (pandas, pipeline) sont faits dans les tâches qui en ont besoin :
+importer ce module ne charge que la stdlib. `transform` renvoie le chemin d'un index
+compact journal -> nb de médicaments distincts, que `load` lit à la place du JSON complet.
+"""
+from __future__ import annotations
+import csv, json
+from pathlib import Path
+from .partition import MANIFEST_NAME
+
+OUTPUT_STEM = "drug_publications_by_atc"
+PARTITION_DIR = "by_atc"
+
+def extract(data_dir: Path) -> dict:
+    """Vérifie la présence des fichiers d'entrée requis."""
+    # Chaque entrée accepte aussi sa variante .parquet
+    required = ["drugs.csv", "clinical_trials.csv"]
+    missing = [n for n in required
+               if not (data_dir / n).exists() and not (data_dir / n).with_suffix(".parquet").exists()]
+    has_pubmed = any((data_dir / f"pubmed.{ext}").exists() for ext in ("csv", "json", "parquet"))
+    if missing or not has_pubmed:
+        raise FileNotFoundError(
+            f"Fichiers manquants: {missing}; pubmed présent ? {has_pubmed}. "
+            f"Attendus dans {data_dir}"
+        )
+    present = sorted(p.name for p in data_dir.glob("*") if p.is_file())
+    print(f"[extract] OK — présents: {present}")
+    return {"present": present}
+
+def transform(data_dir: Path, out_dir: Path, **options) -> dict:
+    """Exécute la pipeline ; `options` : champs de Config (dayfirst -> parse_dayfirst).
+    Renvoie (XCom) le fichier produit, l'index des journaux et les métriques du run."""
+    from .config import Config
+    from .pipeline import run_pipeline
+
+    if "dayfirst" in options:
+        options["parse_dayfirst"] = options.pop("dayfirst")
+    cfg = Config(data_dir=data_dir, out_dir=out_dir, **options)
+    metrics = run_pipeline(cfg)
+    manifest = cfg.partition_dir / MANIFEST_NAME if cfg.output_layout != "single" else None
+    out_file = manifest if cfg.output_layout == "partitioned" else cfg.by_atc_json_fp
+    if not out_file.exists():
+        raise FileNotFoundError(out_file)
+    print(f"[transform] JSON écrit -> {out_file}")
+    index = cfg.journal_index_fp if cfg.journal_index else None
+    return {"out_file": str(out_file), "journal_index": str(index) if index else None,
+            "partitions": str(manifest) if manifest else None, "metrics": metrics}
+
+def _newest(paths: list[Path]) -> Path | None:
+    existing = [p for p in paths if p.exists()]
+    return max(existing, key=lambda p: p.stat().st_mtime) if existing else None
+
+def is_fresh(fp: Path, out_file: Path) -> bool:
+    """`fp` (store, Parquet, index) est-il à jour par rapport à la sortie par ATC `out_file` ?"""
+    return fp.exists() and (not out_file.exists() or fp.stat().st_mtime >= out_file.stat().st_mtime)
+
+def output_file(out_dir: Path) -> Path:
+    """Sortie par ATC du dernier run dans out_dir (manifeste des partitions, JSON ou NDJSON)."""
+    # Manifeste de la sortie partitionnée (supprimé par les runs sans partitions),
+    # sinon sortie la plus récente parmi .json (pretty/compact) et .ndjson
+    manifest = out_dir / PARTITION_DIR / MANIFEST_NAME
+    if manifest.exists():
+        return manifest
+    candidates = [out_dir / f"{OUTPUT_STEM}.{ext}" for ext in ("json", "ndjson")]
+    return _newest(candidates) or candidates[0]
+
+def _ranking(out_dir: Path, source: str | None = None, start: str | None = None, end: str | None = None,
+             atc_prefix: list[str] | None = None, workers: int = 4):
+    """JournalCounter en une passe sur la sortie par ATC : partitions retenues par `atc_prefix`
+    (lues en parallèle) si la sortie est partitionnée, sinon le JSON complet filtré."""
+    from .partition import in_prefixes, rank_partitioned
+    from .ranking import JournalCounter, iter_atc_records
+    out_file = output_file(out_dir)
+    if out_file.name == MANIFEST_NAME:
+        return rank_partitioned(out_file, atc_prefix, workers, source, start, end)
+    prefixes = None if atc_prefix is None else [p.upper() for p in atc_prefix]
+    return JournalCounter(source, start, end).update(
+        (k, obj) for k, obj in iter_atc_records(out_file) if in_prefixes(k, prefixes))
+
+def _journal_rows(out_dir: Path, journal_index: str | Path | None) -> list[tuple[str, int]]:
+    """Index fourni par transform, sinon journal_index.json, store SQLite ou journal_summary.parquet
+    à jour, sinon une passe en streaming sur le JSON complet (ranking.JournalCounter)."""
+    out_file = output_file(out_dir)
+    index_fp = Path(journal_index) if journal_index else out_dir / "journal_index.json"
+    if index_fp.exists() and (journal_index or is_fresh(index_fp, out_file)):
+        return [(j, int(n)) for j, n in json.loads(index_fp.read_text(encoding="utf-8"))]
+
+    store_fp = out_dir / "drug_publications.sqlite"
+    if is_fresh(store_fp, out_file):
+        from contextlib import closing
+        from .store import open_store, top_journals
+        with closing(open_store(store_fp)) as conn:
+            return top_journals(conn)
+
+    summary_fp = out_dir / "journal_summary.parquet"
+    if is_fresh(summary_fp, out_file):
+        # Table Parquet du même run : seules les colonnes atccode/journal sont lues
+        from .io import journal_drug_counts
+        return journal_drug_counts(summary_fp)
+
+    return _ranking(out_dir).rows()
+
+def load(out_dir: Path, journal_index: str | Path | None = None, top_k: int = 1,
+         source: str | None = None, start: str | None = None, end: str | None = None,
+         atc_prefix: list[str] | None = None) -> dict:
+    """Post-traitement : calcule le(s) journal(aux) citant le plus de médicaments distincts et exporte un CSV.
+    journal_index : index renvoyé par transform (évite de relire le JSON complet).
+    top_k : nb de journaux rapportés ; source ("pubmed" / "clinical_trial"), fenêtre de dates
+    start / end (ISO) et atc_prefix (ex. ["N", "A04"] : seuls ces codes ATC, seules leurs partitions
+    lues si la sortie est partitionnée) : classement filtré, calculé en une passe sur la sortie par ATC."""
+    if source or start or end or atc_prefix:
+        rows = _ranking(out_dir, source, start, end, atc_prefix).rows()
+    else:
+        rows = _journal_rows(out_dir, journal_index)
+
+    csv_path = out_dir / "journal_drug_coverage.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["journal", "distinct_drugs"])
+        w.writerows(rows)
+
+    top = rows[0] if rows else ("N/A", 0)
+    print(f"[load] Top journal: {top[0]} — {top[1]} médicaments distincts")
+    return {"csv_path": str(csv_path), "top_journal": top[0], "count": top[1], "top": rows[:top_k]}
@@ -0,0 +1,36 @@
+import pandas as pd
+from test_pipline.aggregate import build_by_atc
+
+def _edges():
+    return pd.DataFrame.from_records([
+        {"drug_atccode": "A1", "drug_name": "X", "source": "pubmed", "pub_id": "2",
+         "title": "t2", "journal": "J \\xc3\\xb1", "date": "2020-01-01"},
+        {"drug_atccode": "A1", "drug_name": "X", "source": "pubmed", "pub_id": None,
+         "title": "t1", "journal": "J ñ", "date": "2019-01-01"},
+        {"drug_atccode": "A1", "drug_name": "X", "source": "clinical_trial", "pub_id": "NCT1",
+         "title": "t3", "journal": "K", "date": None},
+    ])
+
+def test_build_by_atc_rows_and_journals():
+    out = build_by_atc(_edges(), generate_auto_id_if_empty=True)
+    a1 = out["A1"]
+    assert [p["date"] for p in a1["pubmed"]] == ["2019-01-01", "2020-01-01"]
+    assert a1["pubmed"][0]["id"].startswith("AUTO_") and a1["pubmed"][1]["id"] == 2
+    assert a1["clinical_trials"] == [{"id": "NCT1", "title": "t3", "date": None, "journal": "K"}]
+    assert a1["journals"] == [
+        {"journal": "J ñ", "first_date": "2019-01-01", "last_date": "2020-01-01", "n_pubs": 1},
+        {"journal": "K", "first_date": None, "last_date": None, "n_pubs": 1},
+    ]
+
+def test_compact_edges_match_long_edges():
+    from test_pipline.match import build_matcher, build_patterns, find_mentions, find_mentions_compact, CompactEdges
+    m = build_matcher(build_patterns(pd.DataFrame({"atccode": ["A1", "A2"], "drug": ["X", "Y"]})))
+    pubs = pd.DataFrame({"id": [1, None, 3], "title": ["x and y", "nothing", "Y \\xc3\\xb1"],
+                         "journal": ["J", "J", None], "date_iso": ["2020-01-01", None, None]})
+    parts = [find_mentions_compact(pubs, "pubmed", m), find_mentions_compact(pubs.iloc[1:], "clinical_trial", m)]
+    compact = CompactEdges.concat(parts, m.drug_table)
+    long = pd.concat([find_mentions(pubs, "pubmed", m), find_mentions(pubs.iloc[1:], "clinical_trial", m)],
+                     ignore_index=True)
+    assert len(compact.pubs) == 3 and compact.pub.dtype == "int32"
+    pd.testing.assert_frame_equal(compact.to_frame(), long)
+    assert build_by_atc(compact, True) == build_by_atc(long, True)
@@ -0,0 +1,19 @@
+import importlib.util
+from pathlib import Path
+from test_pipline.io import load_lenient_json_list, read_drugs
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(name, Path(__file__).parents[1] / "benchmarks" / f"{name}.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def test_generate_data_is_reproducible_and_lenient(tmp_path):
+    gen = _load("generate_data")
+    counts = gen.generate(tmp_path / "a", titles=200, drugs=20, seed=1)
+    gen.generate(tmp_path / "b", titles=200, drugs=20, seed=1)
+    assert counts == {"drugs": 20, "pubmed_csv": 120, "pubmed_json": 50, "clinical_trials": 30}
+    for name in ("drugs.csv", "pubmed.csv", "pubmed.json", "clinical_trials.csv"):
+        assert (tmp_path / "a" / name).read_bytes() == (tmp_path / "b" / name).read_bytes()
+    assert len(load_lenient_json_list(tmp_path / "a" / "pubmed.json")) == 50
+    assert read_drugs(tmp_path / "a" / "drugs.csv")["atccode"].is_unique
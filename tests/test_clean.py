@@ -1,4 +1,6 @@
-from test_pipline.clean import fix_mojibake, safe_date, safe_id
+import datetime
+import pandas as pd
+from test_pipline.clean import fix_mojibake, fix_mojibake_series, safe_date, safe_id, normalize_dates
 
 def test_fix_mojibake_simple():
     assert fix_mojibake("Journal \\xc3\\xb1") == "Journal ñ"
@@ -11,3 +13,25 @@ def test_safe_id():
     assert safe_id("12") == 12
     assert safe_id("NCT0001") == "NCT0001"
     assert safe_id("") is None
+
+def test_normalize_dates_mixed_formats():
+    raw = pd.Series(["1 January 2020", "25/05/2020", "2019-02-03", None, "garbage", "25/05/2020"])
+    dates, iso = normalize_dates(raw, dayfirst=True)
+    assert iso.tolist()[:3] == ["2020-01-01", "2020-05-25", "2019-02-03"]
+    assert pd.isna(iso[3]) and pd.isna(iso[4]) and pd.isna(dates[4])
+    assert iso[5] == "2020-05-25"
+
+def test_fix_mojibake_fast_path_and_series():
+    assert fix_mojibake("  plain ascii ") == "plain ascii"
+    assert fix_mojibake("ﬁbre") == "fibre"
+    s = pd.Series(["J \\xc3\\xb1", None, "J \\xc3\\xb1", " K "])
+    assert fix_mojibake_series(s).tolist() == ["J ñ", None, "J ñ", "K"]
+
+def test_normalize_dates_year_first_and_datetime_values():
+    # Année en tête ou valeur déjà datée : jamais de permutation jour/mois, même en dayfirst
+    raw = pd.Series(["2020-01-02 00:00:00", "2020-01-02T10:00", "2020-01-02T10:00:00Z", "2020/01/02",
+                     "20200102", pd.Timestamp("2020-01-02"), datetime.date(2020, 1, 2)], dtype=object)
+    assert normalize_dates(raw, dayfirst=True)[1].tolist() == ["2020-01-02"] * 7
+    stamps = pd.Series(pd.to_datetime(["2020-01-02", None]))
+    dates, iso = normalize_dates(stamps, dayfirst=True)
+    assert iso[0] == "2020-01-02" and pd.isna(iso[1]) and dates[0] == pd.Timestamp("2020-01-02")
@@ -0,0 +1,18 @@
+import pandas as pd
+from test_pipline.clean import make_pub_id
+from test_pipline.identity import dedup_publications
+
+def _pubs(**cols):
+    return pd.DataFrame(cols).assign(journal="J", date_iso="2020-01-01")
+
+def test_dedup_by_id_and_content_across_chunks():
+    seen = set()
+    first, dropped = dedup_publications(_pubs(id=[1.0, None, None], title=["a", "Drug  X", "b"]), seen, True)
+    assert dropped == 0
+    assert first["id"].tolist() == ["1", make_pub_id("Drug  X", "J", "2020-01-01"), make_pub_id("b", "J", "2020-01-01")]
+    second, dropped = dedup_publications(_pubs(id=[" 1", None, "2", "2"], title=["a", "drug x", "c", "d"]), seen, True)
+    assert dropped == 3 and second["id"].tolist() == ["2"] and second["title"].tolist() == ["c"]
+
+def test_dedup_without_auto_id_keeps_missing_ids():
+    out, _ = dedup_publications(_pubs(id=[None], title=["a"]), set(), False)
+    assert out["id"].tolist() == [None]
@@ -0,0 +1,18 @@
+from test_pipline.config import Config
+from test_pipline.pipeline import run_pipeline
+
+def _write(d, pubmed_rows):
+    (d / "drugs.csv").write_text("atccode,drug\nA1,ATROPINE\nB2,ETHANOL\n")
+    (d / "clinical_trials.csv").write_text("id,scientific_title,date,journal\nNCT1,Ethanol trial,01/01/2020,K\n")
+    (d / "pubmed.csv").write_text("id,title,date,journal\n" + "".join(pubmed_rows))
+
+def test_incremental_matches_full_run(tmp_path):
+    data, inc, full = tmp_path / "Data", tmp_path / "inc", tmp_path / "full"
+    data.mkdir()
+    rows = ["1,Atropine study,01/01/2019,J\n", "2,Nothing here,02/01/2019,J\n"]
+    for extra in ([], ["3,Ethanol and atropine,03/01/2019,K\n"]):
+        _write(data, rows + extra)
+        run_pipeline(Config(data_dir=data, out_dir=inc, incremental=True))
+        run_pipeline(Config(data_dir=data, out_dir=full))
+        assert (inc / "drug_publications_by_atc.json").read_bytes() == (full / "drug_publications_by_atc.json").read_bytes()
+    assert (inc / "incremental_state.sqlite").exists()
@@ -0,0 +1,64 @@
+import pytest
+from test_pipline.io import (load_lenient_json_list, iter_lenient_json, iter_pubmed, write_by_atc,
+                             tee_columnar, journal_drug_counts, read_drugs)
+from test_pipline.ranking import iter_atc_records
+
+def test_iter_lenient_json_matches_loader(tmp_path):
+    fp = tmp_path / "pubmed.json"
+    fp.write_text('﻿[\n {"id": 1, "title": "a, b",},\n {"id": "2", "title": "c"},\n]', encoding="utf-8")
+    assert list(iter_lenient_json(fp, block_size=4)) == load_lenient_json_list(fp)
+
+def test_iter_lenient_json_ndjson_skips_bad_lines(tmp_path):
+    fp = tmp_path / "pubmed.json"
+    fp.write_text('{"id": 1}\n{oops\n{"id": 3}\n', encoding="utf-8")
+    assert list(iter_lenient_json(fp)) == [{"id": 1}, {"id": 3}]
+
+def test_iter_pubmed_chunks(tmp_path):
+    (tmp_path / "pubmed.csv").write_text("id,title,date,journal\n1,a,01/01/2020,J\n2,b,01/01/2020,J\n3,c,,K\n")
+    (tmp_path / "pubmed.json").write_text('[{"id": 4, "title": "d", "date": "", "journal": "K"}]')
+    chunks = list(iter_pubmed(tmp_path / "pubmed.csv", tmp_path / "pubmed.json", chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 1, 1]
+    assert all(list(c.columns) == ["id", "title", "journal", "date"] for c in chunks)
+
+def test_iter_pubmed_chunks_skip_corrupt_pretty_record(tmp_path):
+    import json
+    recs = [{"id": i, "title": f"t{i}", "journal": "J", "date": "2020-01-01", "mesh": [{"x": i}]} for i in range(8)]
+    lines = json.dumps(recs, indent=2).replace('"title": "t3",', '"title": "t3"').split("\n")
+    # Enregistrement 5 sans accolade fermante : reprise à l'objet suivant, pas à l'intérieur
+    end5 = next(k for k in range(next(k for k, l in enumerate(lines) if '"id": 5' in l), len(lines))
+                if lines[k].strip() == "},")
+    (tmp_path / "pubmed.json").write_text("\n".join(lines[:end5] + lines[end5 + 1:]), encoding="utf-8")
+    assert [o["id"] for o in iter_lenient_json(tmp_path / "pubmed.json", block_size=16)] == [0, 1, 2, 4, 6, 7]
+    chunks = list(iter_pubmed(tmp_path / "pubmed.csv", tmp_path / "pubmed.json", chunk_size=3))
+    assert [c["id"].tolist() for c in chunks] == [[0, 1, 2], [4, 6, 7]]
+
+def test_write_by_atc_formats(tmp_path):
+    import json
+    entries = [("A1", {"drug": "X", "pubmed": [], "journals": [{"journal": "J", "n_pubs": 1}]}), ("B2", {"drug": "Y"})]
+    fp = tmp_path / "out.json"
+    assert write_by_atc(iter(entries), fp) == 2
+    assert fp.read_text(encoding="utf-8") == json.dumps(dict(entries), ensure_ascii=False, indent=2)
+    write_by_atc(iter(entries), fp, "compact")
+    assert json.loads(fp.read_text(encoding="utf-8")) == dict(entries)
+    nd = tmp_path / "out.ndjson"
+    write_by_atc(iter([("A1", {"atccode": "A1"})]), nd, "ndjson")
+    assert list(iter_atc_records(nd)) == [("A1", {"atccode": "A1"})]
+    write_by_atc(iter([]), fp)
+    assert fp.read_text() == "{}" and not (tmp_path / "out.json.tmp").exists()
+
+def test_parquet_roundtrip(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pandas as pd
+    pd.DataFrame({"atccode": ["A1"], "drug": ["X "]}).to_parquet(tmp_path / "drugs.parquet")
+    assert read_drugs(tmp_path / "drugs.parquet")["drug"].tolist() == ["X"]
+    entries = [("A1", {"drug": "X", "pubmed": [{"id": 1, "title": "t", "date": "2020-01-02", "journal": "J"}],
+                       "clinical_trials": [], "journals": [{"journal": "J", "first_date": "2020-01-02",
+                                                            "last_date": "2020-01-02", "n_pubs": 1}]}),
+               ("B2", {"drug": "Y", "pubmed": [], "clinical_trials": [],
+                       "journals": [{"journal": "J", "first_date": None, "last_date": None, "n_pubs": 1}]})]
+    edges_fp, journals_fp = tmp_path / "edges.parquet", tmp_path / "journals.parquet"
+    assert list(tee_columnar(iter(entries), edges_fp, journals_fp, batch_rows=1)) == entries
+    edges = pd.read_parquet(edges_fp)
+    assert edges[["atccode", "id", "source"]].values.tolist() == [["A1", "1", "pubmed"]]
+    assert str(edges["date"].iloc[0]) == "2020-01-02"
+    assert journal_drug_counts(journals_fp) == [("J", 2)]
@@ -0,0 +1,27 @@
+import pytest
+from test_pipline.config import Config
+from test_pipline.loading import prefetch
+from test_pipline.pipeline import run_pipeline
+
+def test_prefetch_keeps_order_and_raises():
+    def items():
+        yield from range(5)
+        raise ValueError("boom")
+    it = prefetch(items(), depth=2)
+    assert [next(it) for _ in range(5)] == [0, 1, 2, 3, 4]
+    with pytest.raises(ValueError):
+        next(it)
+
+def test_concurrent_loading_matches_sequential(tmp_path):
+    data = tmp_path / "Data"
+    data.mkdir()
+    (data / "drugs.csv").write_text("atccode,drug\nA1,ATROPINE\nB2,ETHANOL\n")
+    (data / "pubmed.csv").write_text("id,title,date,journal\n1,Atropine study,01/01/2019,J\n")
+    (data / "pubmed.json").write_text('[{"id": 2, "title": "Ethanol and atropine", "date": "2019-01-02", "journal": "K"},]')
+    (data / "clinical_trials.csv").write_text("id,scientific_title,date,journal\nNCT1,Ethanol trial,01/01/2020,K\n")
+    outs = []
+    for kw in ({"io_threads": 1}, {"io_threads": 4}, {"io_threads": 4, "chunk_size": 1}):
+        out = tmp_path / str(len(outs))
+        run_pipeline(Config(data_dir=data, out_dir=out, **kw))
+        outs.append((out / "drug_publications_by_atc.json").read_bytes())
+    assert outs[0] == outs[1] == outs[2]
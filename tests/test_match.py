@@ -0,0 +1,63 @@
+import pandas as pd
+from test_pipline.match import (build_patterns, build_matcher, find_mentions, find_mentions_parallel_compact, split_shards,
+                                matcher_cache_fp, load_or_build_matcher)
+
+def _drugs():
+    return pd.DataFrame({"atccode": ["A1", "A2", "A3"], "drug": ["ACID", "TRANEXAMIC ACID", "ATROPINE"]})
+
+def test_matcher_whole_word_multiword():
+    m = build_matcher(build_patterns(_drugs()))
+    assert m.search("Tranexamic acid versus atropine") == [0, 1, 2]
+    assert m.search("Atropines and acidic stuff") == []
+
+def test_find_mentions_columns():
+    pubs = pd.DataFrame({"id": [1, 2], "title": ["atropine trial", "nothing"],
+                         "journal": ["J", "K"], "date_iso": ["2020-01-01", None]})
+    edges = find_mentions(pubs, "pubmed", build_patterns(_drugs()))
+    assert list(edges.columns) == ["drug_atccode", "drug_name", "source", "pub_id", "title", "journal", "date"]
+    assert edges["drug_name"].tolist() == ["ATROPINE"]
+    assert find_mentions(pubs.iloc[1:], "pubmed", build_patterns(_drugs())).empty
+
+def test_find_mentions_parallel_matches_serial():
+    pubs = pd.DataFrame({"id": range(40), "title": ["atropine and tranexamic acid", "none"] * 20,
+                         "journal": "J", "date_iso": "2020-01-01"})
+    m = build_matcher(build_patterns(_drugs()))
+    shards = [(part, "pubmed") for part in split_shards(pubs, 5)]
+    parallel = pd.concat([e.to_frame() for e in find_mentions_parallel_compact(shards, m, workers=2)],
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(parallel, find_mentions(pubs, "pubmed", m))
+
+def test_matcher_cache_roundtrip(tmp_path):
+    fp = matcher_cache_fp(_drugs(), tmp_path)
+    m, hit = load_or_build_matcher(_drugs(), fp)
+    cached, hit2 = load_or_build_matcher(_drugs(), fp)
+    assert (hit, hit2) == (False, True)
+    assert cached.search("Tranexamic acid versus atropine") == m.search("Tranexamic acid versus atropine") == [0, 1, 2]
+    assert matcher_cache_fp(_drugs().iloc[:2], tmp_path) != fp
+
+def test_matcher_cache_hit_survives_eviction(tmp_path):
+    import os
+    used = matcher_cache_fp(_drugs(), tmp_path)
+    load_or_build_matcher(_drugs(), used)
+    for n in range(6):
+        for p in tmp_path.glob("matcher-*.pkl"):
+            os.utime(p, (1000 + n, 1000 + n))          # caches construits avant : plus anciens
+        assert load_or_build_matcher(_drugs(), used)[1]  # hit : le cache redevient le plus récent
+        other = pd.DataFrame({"atccode": [f"Z{n}"], "drug": [f"DRUG{n}"]})
+        load_or_build_matcher(other, matcher_cache_fp(other, tmp_path))
+    assert used.exists() and len(list(tmp_path.glob("matcher-*.pkl"))) == 4
+
+def test_pretokenized_titles_recall_mojibake_and_case():
+    drugs = pd.DataFrame({"atccode": ["B1", "B2", "B3"], "drug": ["ÉTHANOL", "BETA-BLOCKER", "İSO"]})
+    m = build_matcher(build_patterns(drugs))
+    assert m.search("Effets de l'\\xc3\\xa9thanol") == [0]        # mojibake réparé avant matching
+    assert m.search("beta-blocker vs beta blocker, i̇so") == [1, 2]
+    assert m.search("beta blocker") == []
+    tokens = m.encode(["\\xc3\\x89thanol", None])
+    assert len(tokens) == 2 and tokens.ids.tolist() == [0] and tokens.offsets.tolist() == [0, 1, 1]
+
+def test_matcher_keeps_original_spacing():
+    drugs = pd.DataFrame({"atccode": ["C1", "C2"], "drug": ["5-FLUOROURACIL", "TRANEXAMIC ACID"]})
+    m = build_matcher(build_patterns(drugs))
+    assert m.search("5-fluorouracil and tranexamic acid") == [0, 1]
+    assert m.search("5 - fluorouracil, tranexamic\n\nacid, tranexamic  acid") == []
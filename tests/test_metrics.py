@@ -0,0 +1,29 @@
+import time
+import tracemalloc
+from test_pipline.metrics import RunMetrics
+
+def test_nested_stages_are_exclusive():
+    m = RunMetrics()
+    def produce():
+        for i in range(3):
+            time.sleep(0.01)
+            yield [i, i]
+    with m.stage("outer"):
+        items = list(m.timed_iter("inner", produce(), len))
+    d = m.to_dict()
+    assert items == [[0, 0], [1, 1], [2, 2]]
+    assert d["stages"]["inner"]["rows"] == 6 and d["stages"]["inner"]["calls"] == 4
+    assert d["stages"]["inner"]["wall_s"] >= 0.03 > d["stages"]["outer"]["wall_s"]
+
+def test_parent_peak_survives_nested_stage():
+    m = RunMetrics(trace_memory=True)
+    with m.stage("outer"):
+        big = bytearray(50 * 2**20)
+        del big
+        with m.stage("inner"):
+            small = bytearray(2**20)
+            del small
+    tracemalloc.stop()
+    d = m.to_dict()
+    assert d["stages"]["outer"]["peak_traced_mb"] >= 50 > d["stages"]["inner"]["peak_traced_mb"]
+    assert "peak_rss_mb" not in d["stages"]["outer"] and "process_peak_rss_mb" in d["total"]
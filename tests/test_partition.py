@@ -0,0 +1,33 @@
+import json
+import pytest
+from test_pipline.io import tee_partitioned, write_by_atc
+from test_pipline.partition import iter_partitioned, rank_partitioned, read_manifest
+from test_pipline.ranking import JournalCounter, iter_atc_records
+
+def _entry(atc, journals):
+    return atc, {"atccode": atc, "drug": atc.lower(), "pubmed": [], "clinical_trials": [],
+                 "journals": [{"journal": j, "first_date": None, "last_date": None, "n_pubs": 1} for j in journals]}
+
+RECORDS = [_entry("A01", ["J1"]), _entry("A02", ["J1", "J2"]), _entry("N05", ["J2"]),
+           _entry("N06", ["J3"]), _entry("R03", ["J1"])]
+
+@pytest.mark.parametrize("fmt", ["pretty", "ndjson"])
+def test_partitions_match_single_file(tmp_path, fmt):
+    single = tmp_path / ("o.ndjson" if fmt == "ndjson" else "o.json")
+    parts = tmp_path / "by_atc"
+    # batch_size=1 : plusieurs lots par partition, écrits par le pool dans l'ordre
+    assert write_by_atc(tee_partitioned(RECORDS, parts, fmt, workers=3, batch_size=1), single, fmt) == 5
+    manifest = read_manifest(parts)
+    assert {k: v["n_atc"] for k, v in manifest["shards"].items()} == {"A": 2, "N": 2, "R": 1}
+    assert list(iter_partitioned(parts, workers=2, verify=True)) == list(iter_atc_records(single))
+    assert [k for k, _ in iter_partitioned(parts, prefixes=["n05", "R"])] == ["N05", "R03"]
+    assert rank_partitioned(parts, workers=2).rows() == JournalCounter().update(RECORDS).rows()
+    assert rank_partitioned(parts, prefixes=["A"]).rows() == [("J1", 2), ("J2", 1)]
+
+    # Partition altérée : détectée par le sha256 du manifeste
+    (parts / manifest["shards"]["N"]["file"]).write_text(json.dumps({}), encoding="utf-8")
+    with pytest.raises(ValueError):
+        rank_partitioned(parts, prefixes=["N"], verify=True)
+    # Nouveau run sans la partition R : l'ancien fichier est supprimé
+    list(tee_partitioned(RECORDS[:4], parts, fmt))
+    assert sorted(p.name for p in parts.iterdir()) == ["A" + single.suffix, "N" + single.suffix, "manifest.json"]
@@ -0,0 +1,50 @@
+import json
+from test_pipline.io import write_by_atc
+from test_pipline.ranking import JournalCounter, iter_atc_records
+
+def _entry(atc, pubmed, trials, journals):
+    pub = lambda j, d: {"id": 1, "title": "t", "date": d, "journal": j}
+    return atc, {"atccode": atc, "pubmed": [pub(*x) for x in pubmed],
+                  "clinical_trials": [pub(*x) for x in trials],
+                  "journals": [{"journal": j, "first_date": f, "last_date": l, "n_pubs": 1} for j, f, l in journals]}
+
+RECORDS = [
+    _entry("A", [("J1", "2019-01-01")], [("J2", "2021-06-01")],
+           [("J1", "2019-01-01", "2019-01-01"), ("J2", "2021-06-01", "2021-06-01")]),
+    _entry("B", [("J1", "2020-03-01"), ("J1", "2022-01-01")], [],
+           [("J1", "2020-03-01", "2022-01-01")]),
+    _entry("C", [], [("J2", None)], [("J2", None, None)]),
+]
+
+def test_counter_top_k_filters_and_exclusive():
+    c = JournalCounter().update(RECORDS)
+    assert c.rows() == [("J1", 2), ("J2", 2)] and c.top(1) == [("J1", 2)]
+    assert c.exclusive_rows() == [("J1", 1, 2), ("J2", 1, 2)]
+    assert JournalCounter(source="clinical_trial").update(RECORDS).rows() == [("J2", 2)]
+    # Fenêtre : chevauchement de [first_date, last_date] ; les couples non datés sont exclus
+    assert JournalCounter(start="2021-01-01", end="2021-12-31").update(RECORDS).rows() == [("J1", 1), ("J2", 1)]
+    assert JournalCounter(source="pubmed", end="2019-12-31").update(RECORDS).rows() == [("J1", 1)]
+
+def test_iter_atc_records_streams_all_formats(tmp_path):
+    for fmt, name in (("pretty", "o.json"), ("compact", "o.json"), ("ndjson", "o.ndjson")):
+        write_by_atc(RECORDS, tmp_path / name, fmt)
+        got = list(iter_atc_records(tmp_path / name, block_size=16))
+        assert [k for k, _ in got] == ["A", "B", "C"]
+        assert got == RECORDS
+
+def test_iter_atc_records_large_entry_is_not_quadratic(tmp_path, monkeypatch):
+    # Entrée de ~3 Mo lue par blocs de 4 Ko : la lecture double à chaque échec de décodage,
+    # donc quelques dizaines de décodages au plus (et non un par bloc, ~750).
+    big = _entry("BIG", [("J%d" % i, "2020-01-01") for i in range(30000)], [], [])
+    records = [RECORDS[0], big, RECORDS[1]]
+    fp = tmp_path / "o.json"
+    write_by_atc(records, fp, "pretty")
+    assert fp.stat().st_size > 3_000_000
+    calls = []
+    class Decoder(json.JSONDecoder):
+        def raw_decode(self, s, idx=0):
+            calls.append(idx)
+            return super().raw_decode(s, idx)
+    monkeypatch.setattr(json, "JSONDecoder", Decoder)
+    assert list(iter_atc_records(fp, block_size=4096)) == records
+    assert len(calls) < 100
@@ -0,0 +1,26 @@
+import json
+from contextlib import closing
+from pathlib import Path
+from test_pipline import tasks
+from test_pipline.store import open_store, top_journals, publications_for_atc, drugs_in_journal
+
+DATA = Path(__file__).parents[1] / "Data"
+
+def test_store_answers_match_json(tmp_path):
+    res = tasks.transform(DATA, tmp_path, dayfirst=False, columnar_output=False, journal_index=False)
+    by_atc = json.loads(Path(res["out_file"]).read_text(encoding="utf-8"))
+    with closing(open_store(tmp_path / "drug_publications.sqlite")) as conn:
+        rows = top_journals(conn)
+        counts: dict = {}
+        for atc, obj in by_atc.items():
+            for j in obj["journals"]:
+                counts.setdefault(j["journal"], set()).add(atc)
+        assert rows == sorted(((j, len(s)) for j, s in counts.items() if j), key=lambda x: (-x[1], x[0]))
+        atc, obj = next((k, o) for k, o in by_atc.items() if o["pubmed"] and o["clinical_trials"])
+        assert [p["title"] for p in publications_for_atc(conn, atc)] == \
+               [p["title"] for p in obj["pubmed"] + obj["clinical_trials"]]
+        assert [p["title"] for p in publications_for_atc(conn, atc, "pubmed")] == [p["title"] for p in obj["pubmed"]]
+        journal = rows[0][0]
+        drugs = drugs_in_journal(conn, journal)
+        assert len(drugs) == rows[0][1]
+        assert drugs_in_journal(conn, journal, start="2100-01-01") == []
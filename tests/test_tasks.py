@@ -0,0 +1,27 @@
+import subprocess, sys
+from pathlib import Path
+from test_pipline import tasks
+
+DATA = Path(__file__).parents[1] / "Data"
+
+def test_tasks_import_is_light():
+    code = "import sys; from test_pipline import tasks; print('pandas' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         env={"PYTHONPATH": str(Path(__file__).parents[1] / "src")}, check=True)
+    assert out.stdout.strip() == "False"
+
+def test_load_from_index_matches_full_json(tmp_path):
+    res = tasks.transform(DATA, tmp_path, dayfirst=False, columnar_output=False)
+    from_index = tasks.load(tmp_path, res["journal_index"])
+    Path(res["journal_index"]).unlink()
+    assert tasks.load(tmp_path) == from_index
+    assert res["metrics"]["counts"]["atc"] > 0
+
+def test_store_is_fresh_only_for_the_run_that_wrote_it(tmp_path):
+    import os
+    tasks.transform(DATA, tmp_path, dayfirst=False, columnar_output=False, journal_index=False)
+    out, store = tasks.output_file(tmp_path), tmp_path / "drug_publications.sqlite"
+    assert tasks.is_fresh(store, out)          # finalisé avant le JSON, mais daté après lui
+    later = out.stat().st_mtime + 10
+    os.utime(out, (later, later))               # JSON réécrit depuis : le store n'est plus à jour
+    assert not tasks.is_fresh(store, out)
@@ -1,45 +1,102 @@
 #!/usr/bin/env python3
+"""Top journal(aux) par nb de médicaments distincts.
+
+Par défaut, la réponse vient du store SQLite écrit par la pipeline
+(outputs/drug_publications.sqlite : requête indexée, sans charger le JSON) s'il est à jour,
+sinon de la sortie par ATC du dernier run ;
+--input accepte aussi le JSON/NDJSON par ATC, la sortie partitionnée (outputs/by_atc/ ou son
+manifest.json) ou journal_summary.parquet.
+Les classements filtrés (--source, --from/--to, --atc-prefix), le top-k et l'analyse des journaux
+exclusifs passent par test_pipline.ranking, en une passe sur les entrées par ATC ; sur la sortie
+partitionnée, seules les partitions utiles sont lues, en parallèle (--workers).
+"""
 from __future__ import annotations
-import json
+import sys
+from contextlib import closing
 from pathlib import Path
 from argparse import ArgumentParser
-from typing import Dict, Set, List, Tuple
+from typing import Iterator, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT / "src") not in sys.path:
+    sys.path.append(str(ROOT / "src"))
+
+from test_pipline.ranking import SOURCE_FIELDS, JournalCounter, iter_atc_records
+from test_pipline.partition import MANIFEST_NAME, in_prefixes, iter_partitioned, rank_partitioned
+from test_pipline.tasks import is_fresh, output_file
+
+STORE_SUFFIXES = (".sqlite", ".db")
+
+def is_partitioned(path: Path) -> bool:
+    return path.is_dir() or path.name == MANIFEST_NAME
 
-def load_by_atc(path: Path) -> dict:
-    data = json.loads(path.read_text(encoding="utf-8"))
-    if not isinstance(data, dict):
-        raise ValueError("Le JSON attendu est un dict indexé par codes ATC.")
-    return data
+def iter_records(path: Path) -> Iterator[Tuple[str, dict]]:
+    """Entrées par ATC depuis le store SQLite, la sortie partitionnée ou le JSON/NDJSON (lecture en streaming)."""
+    if is_partitioned(path):
+        yield from iter_partitioned(path)
+    elif path.suffix in STORE_SUFFIXES:
+        from test_pipline.store import open_store, iter_records as store_records
+        with closing(open_store(path)) as conn:
+            yield from store_records(conn)
+    else:
+        yield from iter_atc_records(path)
 
-def compute_counts(by_atc: dict) -> Dict[str, Set[str]]:
-    journal_to_drugs: Dict[str, Set[str]] = {}
-    for atc, obj in by_atc.items():
-        for j in (obj.get("journals", []) or []):
-            if isinstance(j, dict):
-                name = j.get("journal")
-            elif isinstance(j, str):
-                name = j
-            else:
-                name = None
-            if not name:
-                continue
-            journal_to_drugs.setdefault(name, set()).add(atc)
-    return journal_to_drugs
+def load_rows_store(path: Path, limit: int | None = None) -> List[Tuple[str, int]]:
+    # Store SQLite : table journals indexée par (n_drugs DESC, journal), déjà triée
+    from test_pipline.store import open_store, top_journals
+    with closing(open_store(path)) as conn:
+        return top_journals(conn, limit)
 
-def sort_rows(journal_to_drugs: Dict[str, Set[str]]) -> List[Tuple[str, int]]:
-    return sorted(((j, len(s)) for j, s in journal_to_drugs.items()), key=lambda x: (-x[1], x[0]))
+def default_input(out_dir: Path = Path("outputs")) -> Path:
+    """Store SQLite s'il est à jour par rapport à la sortie par ATC (même contrôle que `load`),
+    sinon cette sortie (manifeste des partitions, ou JSON/NDJSON le plus récent)."""
+    out_file = output_file(out_dir)
+    store = out_dir / "drug_publications.sqlite"
+    return store if is_fresh(store, out_file) else out_file
 
 def main():
     p = ArgumentParser()
-    p.add_argument("--input", type=Path, default=Path("outputs") / "drug_publications_by_atc.json")
+    p.add_argument("--input", type=Path, default=None,
+                   help="store .sqlite (défaut s'il existe), sortie partitionnée (dossier by_atc ou manifest.json), "
+                        "JSON/NDJSON par ATC ou journal_summary.parquet")
     p.add_argument("--export-csv", type=Path, default=Path("outputs") / "journal_drug_coverage.csv")
-    p.add_argument("--csv-mode", choices=["top1", "all"], default="top1")
-    p.add_argument("--exclusive", action="store_true")
+    p.add_argument("--csv-mode", choices=["top1", "topk", "all"], default="top1")
+    p.add_argument("--top-k", type=int, default=1, help="nb de journaux affichés (et exportés en --csv-mode topk)")
+    p.add_argument("--source", choices=list(SOURCE_FIELDS), help="ne compter qu'une source")
+    p.add_argument("--from", dest="start", help="début de fenêtre (date ISO incluse)")
+    p.add_argument("--to", dest="end", help="fin de fenêtre (date ISO incluse)")
+    p.add_argument("--atc-prefix", nargs="+", help="ne compter que ces codes ATC (ex. N A04)")
+    p.add_argument("--workers", type=int, default=4, help="partitions lues en parallèle (sortie partitionnée)")
+    p.add_argument("--verify", action="store_true", help="contrôler le sha256 des partitions lues")
+    p.add_argument("--exclusive-journals", action="store_true",
+                   help="journaux seuls à citer un médicament (colonne exclusive_drugs dans le CSV)")
+    p.add_argument("--exclusive", action="store_true", help="ne pas écraser un CSV existant")
     args = p.parse_args()
 
-    by_atc = load_by_atc(args.input)
-    journal_to_drugs = compute_counts(by_atc)
-    rows = sort_rows(journal_to_drugs)
+    src = args.input or default_input()
+    k = max(1, args.top_k)
+    n_rows = None if args.csv_mode == "all" else k
+    ranking = None
+    filtered = args.source or args.start or args.end or args.atc_prefix or args.exclusive_journals
+    if filtered or is_partitioned(src) or src.suffix not in STORE_SUFFIXES + (".parquet",):
+        if src.suffix == ".parquet":
+            p.error("--source/--from/--to/--atc-prefix/--exclusive-journals : entrée store SQLite ou JSON requise")
+        if is_partitioned(src):
+            # Partitions utiles seulement, un compteur par partition (threads), fusionnés
+            ranking = rank_partitioned(src, args.atc_prefix, args.workers, args.source, args.start, args.end,
+                                       verify=args.verify)
+        else:
+            # Une passe en streaming : un compteur par journal, top-k par tas
+            prefixes = [x.upper() for x in args.atc_prefix] if args.atc_prefix else None
+            ranking = JournalCounter(args.source, args.start, args.end).update(
+                (k, obj) for k, obj in iter_records(src) if in_prefixes(k, prefixes))
+        rows = ranking.rows() if n_rows is None else ranking.top(n_rows)
+    elif src.suffix == ".parquet":
+        # journal_summary.parquet : même lecture que la pipeline (colonnes utiles, memory-map)
+        from test_pipline.io import journal_drug_counts
+        rows = journal_drug_counts(src)
+    else:
+        rows = load_rows_store(src, n_rows)
 
     if not rows:
         print("Aucun journal trouvé")
@@ -47,6 +104,13 @@ def main():
 
     top_journal, top_count = rows[0]
     print(f"Top journal: {top_journal} — {top_count} médicaments distincts")
+    for j, c in rows[1:k]:
+        print(f"            {j} — {c} médicaments distincts")
+    exclusive = {}
+    if ranking is not None and args.exclusive_journals:
+        exclusive = {j: n for j, n, _ in ranking.exclusive_rows()}
+        for j, n, c in ranking.exclusive_rows(k):
+            print(f"Journal exclusif: {j} — seul à citer {n} des {c} médicaments")
 
     try:
         args.export_csv.parent.mkdir(parents=True, exist_ok=True)
@@ -54,12 +118,9 @@ def main():
         mode = "x" if args.exclusive else "w"
         with args.export_csv.open(mode, newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow(["journal", "distinct_drugs"])
-            if args.csv_mode == "top1":
-                w.writerow([top_journal, top_count])
-            else:
-                for j, c in rows:
-                    w.writerow([j, c])
+            w.writerow(["journal", "distinct_drugs"] + (["exclusive_drugs"] if args.exclusive_journals else []))
+            for j, c in rows[:1] if args.csv_mode == "top1" else rows[:n_rows]:
+                w.writerow([j, c] + ([exclusive.get(j, 0)] if args.exclusive_journals else []))
         print(f"[ok] CSV écrit → {args.export_csv} ({args.csv_mode})")
     except FileExistsError:
         print(f"[warn] Le fichier existe déjà et --exclusive est activé: {args.export_csv}")